@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# End-to-end activation benchmark on the lib.simulation backends: replays
+# scripted distance traces through ActivationSensor with a fake ToF sensor,
+# LED strip, mixer and GPIO on SDL's dummy display, and reports how long
+# after the visitor crossed the threshold the mirror reacted, the display
+# and LED frame rates, per-task scheduler stats and CPU time per thread
+# (from /proc/self/task), plus the lib.metrics timing histograms.
+# 'restarts' is a regression check rather than a trace: the display is
+# switched on and off repeatedly while it's still fading out.
+# ./benchmarks/activation_benchmark.py [trace|restarts ...]
+import logging
+import os
+import sys
+import threading
+import time
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+os.environ['MIRROR_HEADLESS'] = '1'
+
+import pygame
+import mirror
+from lib import metrics
+from lib.ledstrip import LED_COUNT
+from lib.startup import Startup
+from lib.simulation import DistanceTrace, FakeLibrary, FakeToF, FrameRecorder, NullMixer
+from logger import Logger
+
+SENSOR_NOISE = 15  # mm
+SAMPLE_INTERVAL = 0.25  # seconds between CPU samples
+
+# (seconds, mm) points; DISTANCE_THRESHOLD is 1000mm, the exit threshold 1200mm
+TRACES = {
+    # Walk up at about 1m/s, stay a while and walk off
+    'walk_up': [(0, 2500), (2, 2500), (4, 500), (12, 500), (14, 2500), (20, 2500)],
+    # Stroll past without stopping, should pre-warm at most
+    'pass_by': [(0, 2500), (2, 2500), (3, 1100), (4, 2500), (8, 2500)],
+    # Hover around the threshold before committing, then leave and come back
+    'hover': [(0, 2500), (2, 1050), (4, 950), (5, 1100), (6, 900), (10, 900), (11, 1500),
+              (12, 900), (16, 900), (17, 2500), (23, 2500)],
+}
+
+
+class CPUSampler:
+    """Keeps the latest utime + stime of every thread in the process, by name."""
+
+    def __init__(self):
+        self.ticks = os.sysconf('SC_CLK_TCK')
+        self.names = {}
+        self.cpu = {}  # tid -> seconds
+        self.baseline = {}
+
+    def sample(self):
+        for thread in threading.enumerate():
+            if thread.native_id is not None:
+                self.names[thread.native_id] = thread.name
+        for tid in os.listdir('/proc/self/task'):
+            try:
+                with open('/proc/self/task/' + tid + '/stat') as stat:
+                    fields = stat.read().rsplit(')', 1)[1].split()
+            except OSError:
+                continue
+            self.cpu[int(tid)] = (int(fields[11]) + int(fields[12])) / self.ticks
+
+    def start(self):
+        self.sample()
+        self.baseline = dict(self.cpu)
+
+    def by_name(self):
+        """CPU seconds per thread name since start(), SDL and other native threads lumped together."""
+        totals = {}
+        for tid, seconds in self.cpu.items():
+            name = self.names.get(tid, 'native')
+            totals[name] = totals.get(name, 0.0) + seconds - self.baseline.get(tid, 0.0)
+        return totals
+
+
+def first_after(times, start, end=None):
+    for t in times:
+        if t >= start and (end is None or t < end):
+            return t
+    return None
+
+
+def ms(start, end):
+    if start is None or end is None:
+        return '-'
+    return str(round((end - start) * 1000)) + 'ms'
+
+
+def replay(name, points, relay_list):
+    trace = DistanceTrace(points)
+    strip = FrameRecorder(LED_COUNT)
+    mixer = NullMixer()
+    sound = mirror.Sound(mixer, FakeLibrary())
+    startup = Startup()
+    sensor = mirror.ActivationSensor(relay_list, sound, strip, lambda *args: FakeToF(trace, SENSOR_NOISE), startup)
+
+    # Note when the mirror changes state and when each display frame goes out
+    changes = []
+    presents = []
+    state_changed = sensor.state_changed
+    present = sensor.mirror.present
+
+    def record_change(state):
+        changes.append((time.monotonic(), state))
+        state_changed(state)
+
+    def record_present(rect=None):
+        presents.append(time.monotonic())
+        present(rect)
+
+    sensor.state_changed = record_change
+    sensor.mirror.present = record_present
+
+    metrics.reset()
+    cpu = CPUSampler()
+    cpu.start()
+    trace.start()
+    started = trace.started
+    end = started + trace.duration()
+    next_sample = started
+    while time.monotonic() < end:
+        event = pygame.event.wait(50)
+        if event.type != pygame.NOEVENT:
+            mirror.handle_event(sensor, event)
+        if time.monotonic() >= next_sample:
+            next_sample += SAMPLE_INTERVAL
+            cpu.sample()
+
+    if sensor.input_state:
+        sensor.state_changed(False)
+    sensor.stop()
+    cpu.sample()
+    elapsed = time.monotonic() - started
+
+    print('== ' + name + ' (' + str(round(trace.duration(), 1)) + 's)')
+    print('  ' + startup.report())
+    crossings = trace.crossings(mirror.DISTANCE_THRESHOLD, mirror.DISTANCE_EXIT_THRESHOLD)
+    for index, (offset, entered) in enumerate(crossings):
+        crossed = started + offset
+        # Only count a reaction that came before the trace crossed back
+        until = started + crossings[index + 1][0] if index + 1 < len(crossings) else None
+        changed = first_after([t for t, state in changes if state == entered], crossed, until)
+        if changed is None:
+            print('  %-10s %5.2fs: no change' % ('entered at' if entered else 'left at', offset))
+        elif entered:
+            print('  entered at %5.2fs: activated +%s, first frame +%s, LEDs +%s, audio +%s' % (
+                offset, ms(crossed, changed), ms(crossed, first_after(presents, changed)),
+                ms(crossed, first_after(strip.lit_times, changed)),
+                ms(crossed, first_after([t for t, _ in mixer.plays], changed))))
+        else:
+            print('  left at    %5.2fs: deactivated +%s' % (offset, ms(crossed, changed)))
+    print('  activations: ' + str(len([c for c in changes if c[1]])) + ' (trace crosses in ' +
+          str(len([c for c in crossings if c[1]])) + ' time(s))')
+
+    # Fades present at FadingText.FRAME_RATE and sit idle in between, so only
+    # count frames that followed another closely
+    gaps = [b - a for a, b in zip(presents, presents[1:]) if b - a < 0.25]
+    display_fps = len(gaps) / sum(gaps) if gaps else 0.0
+    print('  display: ' + str(len(presents)) + ' frames, %.1f fps while fading' % display_fps)
+    print('  LEDs: ' + str(strip.shows) + ' frames, last run ' + str(sensor.led_strip.effects.stats()))
+    print('  sensor reads: ' + str(sum(s.reads for s in sensor.dme.sensors)) + ', ' + str(sensor.dme.health()))
+    for scheduler in [sensor.scheduler, sensor.sensor_scheduler]:
+        print('  ' + scheduler.name + ' tasks: ' + str(scheduler.stats()))
+    snapshot = metrics.snapshot()
+    print('  counters: ' + str(snapshot['counters']))
+    for metric, histogram in snapshot['histograms'].items():
+        if histogram['count']:
+            print('    %-24s n=%-5d avg %7.3fms  p95 <=%gms  max %7.3fms' % (
+                metric, histogram['count'], histogram['avg_ms'], histogram['p95_ms'], histogram['max_ms']))
+    print('  CPU over %.1fs:' % elapsed)
+    for thread, seconds in sorted(cpu.by_name().items(), key=lambda item: -item[1]):
+        print('    %-14s %6.2fs  %5.1f%%' % (thread, seconds, seconds / elapsed * 100))
+
+
+def restarts(relay_list):
+    """run/stop/run/stop/run during a fade out has to end with phrases on screen."""
+    trace = DistanceTrace([(0, 2500), (1, 2500)])
+    sensor = mirror.ActivationSensor(relay_list, mirror.Sound(NullMixer(), FakeLibrary()), FrameRecorder(LED_COUNT),
+                                     lambda *args: FakeToF(trace))
+    display = sensor.mirror
+    presents = []
+    present = display.present
+
+    def record_present(rect=None):
+        presents.append(time.monotonic())
+        present(rect)
+
+    display.present = record_present
+    display.run()
+    time.sleep(1.0)
+    display.stop()
+    display.run()
+    display.stop()
+    last_run = time.monotonic()
+    display.run()
+    tasks = [display.mirror_text.task]
+    time.sleep(4.0)
+    failed = [task.name for task in tasks if task.error is not None]
+    first = first_after(presents, last_run + 1.0)  # after the first fade out is done
+    sensor.stop()
+
+    print('== restarts')
+    if failed or first is None:
+        print('  FAILED: ' + (str(tasks[0].error) if failed else 'nothing shown after the last run()'))
+        return False
+    print('  ok, showing again ' + ms(last_run, first) + ' after the last run()')
+    return True
+
+
+def main(argv):
+    # Warnings only; the interesting numbers are printed below
+    logging.basicConfig(level=logging.WARNING)
+    Logger.write = logging.getLogger()
+
+    names = argv[1:] if len(argv) > 1 else list(TRACES.keys()) + ['restarts']
+    metrics.enable()
+    pygame.init()
+    relay_list = list(mirror.RELAYS.values())
+    mirror.MirrorIO.init_gpio(relay_list)
+    ok = True
+    for name in names:
+        if name == 'restarts':
+            ok = restarts(relay_list) and ok
+        else:
+            replay(name, TRACES[name], relay_list)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# Microbenchmark of the VL53L0X i2c callbacks against a mock bus: the old
+# smbus callbacks versus lib.i2c_transport's smbus and ioctl transports (the
+# ioctl itself is stubbed out, so this measures the Python side only). Calls
+# go through CFUNCTYPE wrappers, as they do when the ST library calls back.
+# ./benchmarks/i2c_benchmark.py [iterations]
+import os
+import sys
+import time
+from ctypes import *
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+import lib.i2c_transport
+from lib.i2c_transport import DevI2CTransport, SMBusTransport
+
+CALLBACK = CFUNCTYPE(c_int, c_ubyte, c_ubyte, POINTER(c_ubyte), c_ubyte)
+ADDRESS = 0x29
+REGISTER = 0x14
+# Single register accesses dominate a ranging measurement, with the odd block read
+LENGTHS = [1, 2, 4, 12, 64]
+
+
+class MockBus:
+    """Stands in for smbus.SMBus, returning a fixed pattern."""
+
+    def __init__(self):
+        self.data = list(range(256))
+        self.written = 0
+
+    def read_i2c_block_data(self, address, reg, length):
+        return self.data[:length]
+
+    def write_i2c_block_data(self, address, reg, data):
+        self.written += len(data)
+
+
+class MockIoctl:
+    """Stands in for the fcntl module so DevI2CTransport never touches a device."""
+
+    @staticmethod
+    def ioctl(fd, request, arg):
+        return 0
+
+
+class MockDevTransport(DevI2CTransport):
+    def __init__(self):
+        DevI2CTransport.__init__(self, bus_number=None)
+
+    def close(self):
+        pass
+
+
+def legacy_callbacks(bus):
+    """The callbacks lib/VL53L0X.py used to define."""
+    def i2c_read(address, reg, data_p, length):
+        ret_val = 0
+        result = []
+
+        try:
+            result = bus.read_i2c_block_data(address, reg, length)
+        except IOError:
+            ret_val = -1
+
+        if ret_val == 0:
+            for index in range(length):
+                data_p[index] = result[index]
+
+        return ret_val
+
+    def i2c_write(address, reg, data_p, length):
+        ret_val = 0
+        data = []
+
+        for index in range(length):
+            data.append(data_p[index])
+        try:
+            bus.write_i2c_block_data(address, reg, data)
+        except IOError:
+            ret_val = -1
+
+        return ret_val
+
+    return i2c_read, i2c_write
+
+
+def time_callback(callback, length, iterations):
+    buf = (c_ubyte * 256)()
+    data_p = cast(buf, POINTER(c_ubyte))
+    start = time.perf_counter()
+    for _ in range(iterations):
+        callback(ADDRESS, REGISTER, data_p, length)
+    return (time.perf_counter() - start) / iterations
+
+
+def main(argv):
+    iterations = int(argv[1]) if len(argv) > 1 else 100000
+
+    lib.i2c_transport.fcntl = MockIoctl
+    legacy_read, legacy_write = legacy_callbacks(MockBus())
+    smbus_transport = SMBusTransport(MockBus())
+    dev_transport = MockDevTransport()
+
+    callbacks = [
+        ('read', CALLBACK(legacy_read), CALLBACK(smbus_transport.read), CALLBACK(dev_transport.read)),
+        ('write', CALLBACK(legacy_write), CALLBACK(smbus_transport.write), CALLBACK(dev_transport.write)),
+    ]
+
+    for name, legacy, smbus_callback, dev_callback in callbacks:
+        for length in LENGTHS:
+            legacy_time = time_callback(legacy, length, iterations)
+            smbus_time = time_callback(smbus_callback, length, iterations)
+            dev_time = time_callback(dev_callback, length, iterations)
+            print('%-5s %3d bytes: legacy %6.2f us, smbus %6.2f us (%.1fx), ioctl %6.2f us (%.1fx)' % (
+                name, length, legacy_time * 1e6,
+                smbus_time * 1e6, legacy_time / smbus_time,
+                dev_time * 1e6, legacy_time / dev_time))
+
+    print('smbus transport stats: ' + str(smbus_transport.stats()))
+    print('ioctl transport stats: ' + str(dev_transport.stats()))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
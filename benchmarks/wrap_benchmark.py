@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# Compare the old character-at-a-time word wrap with lib.text_wrap on long
+# phrases. Run from anywhere: ./benchmarks/wrap_benchmark.py [iterations]
+import os
+import sys
+import time
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+import pygame
+from lib.text_wrap import wrap_text
+
+FONT_SIZE = 72
+SCREEN_SIZE = (1920, 1080)
+MARGIN = 0.10
+LINE_SPACING = -2
+
+PHRASES = [
+    "you are fearfully and wonderfully made",
+    "His grace is sufficient for you, for His power is made perfect in weakness",
+    "be strong and courageous, do not be afraid or terrified because of them, "
+    "for the Lord your God goes with you; He will never leave you nor forsake you",
+    "Therefore do not worry about tomorrow, for tomorrow will worry about itself. "
+    "Each day has enough trouble of its own. " * 3,
+]
+
+
+def legacy_wrap(font, text, box, line_spacing):
+    """The wrap loop FadingText.predraw() used to run, one measurement per character."""
+    lines = text.splitlines()
+    wrapped = []
+    y = 0
+    box_w, box_h = box
+    font_height = font.size('Tg')[1]
+
+    while lines:
+        if y + font_height > box_h:
+            break
+
+        line = lines.pop(0)
+
+        if len(line) == 0:
+            wrapped.append("")
+            y += line_spacing
+
+        while line:
+            i = 1
+
+            while font.size(line[:i])[0] < box_w and i < len(line):
+                i += 1
+
+            if i < len(line):
+                i = line.rfind(" ", 0, i) + 1
+
+            wrapped.append(line[:i])
+            y += line_spacing
+            line = line[i:]
+
+    return wrapped
+
+
+def time_wrap(wrap, font, text, box, line_spacing, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        wrap(font, text, box, line_spacing)
+    return (time.perf_counter() - start) / iterations
+
+
+def main(argv):
+    iterations = int(argv[1]) if len(argv) > 1 else 20
+
+    pygame.font.init()
+    box = (int(SCREEN_SIZE[0] * (1 - MARGIN)), int(SCREEN_SIZE[1] * (1 - MARGIN)))
+    fontdir = os.path.join(BASE_PATH, 'data', 'fonts')
+
+    for file in sorted(os.listdir(fontdir)):
+        font = pygame.font.Font(os.path.join(fontdir, file), FONT_SIZE)
+        line_spacing = font.size('Tg')[1] + LINE_SPACING
+        print(file)
+
+        for text in PHRASES:
+            expected = legacy_wrap(font, text, box, line_spacing)
+            actual = wrap_text(font, text, box, line_spacing)
+            if actual != expected:
+                print('  MISMATCH for ' + repr(text[:40]))
+                print('    legacy:    ' + repr(expected))
+                print('    text_wrap: ' + repr(actual))
+                continue
+
+            legacy = time_wrap(legacy_wrap, font, text, box, line_spacing, iterations)
+            fast = time_wrap(wrap_text, font, text, box, line_spacing, iterations)
+            print('  %4d chars, %2d lines: legacy %8.3f ms, text_wrap %7.3f ms (%.1fx)' % (
+                len(text), len(actual), legacy * 1000, fast * 1000, legacy / fast))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -24,7 +24,7 @@
 
 import time
 from ctypes import *
-import smbus
+from lib.i2c_transport import open_transport
 
 VL53L0X_GOOD_ACCURACY_MODE      = 0   # Good Accuracy mode
 VL53L0X_BETTER_ACCURACY_MODE    = 1   # Better Accuracy mode
@@ -32,51 +32,39 @@ VL53L0X_BEST_ACCURACY_MODE      = 2   # Best Accuracy mode
 VL53L0X_LONG_RANGE_MODE         = 3   # Longe Range mode
 VL53L0X_HIGH_SPEED_MODE         = 4   # High Speed mode
 
-i2cbus = smbus.SMBus(1)
+# The shared library, i2c bus transport and callback pointers are set up by
+# load_library() when the first sensor is created, so this module can be
+# imported on machines without the sensor (e.g. for simulation)
+tof_lib = None
+i2c_transport = None
+read_func = None
+write_func = None
 
-# i2c bus read callback
-def i2c_read(address, reg, data_p, length):
-    ret_val = 0;
-    result = []
- 
-    try:
-        result = i2cbus.read_i2c_block_data(address, reg, length)
-    except IOError:
-        ret_val = -1; 
-
-    if (ret_val == 0):
-        for index in range(length):
-            data_p[index] = result[index]
-
-    return ret_val
-
-# i2c bus write callback
-def i2c_write(address, reg, data_p, length):
-    ret_val = 0;
-    data = []
+# Callback signatures for the i2c read and write functions
+READFUNC = CFUNCTYPE(c_int, c_ubyte, c_ubyte, POINTER(c_ubyte), c_ubyte)
+WRITEFUNC = CFUNCTYPE(c_int, c_ubyte, c_ubyte, POINTER(c_ubyte), c_ubyte)
 
-    for index in range(length):
-        data.append(data_p[index])
-    try:
-        i2cbus.write_i2c_block_data(address, reg, data)
-    except IOError:
-        ret_val = -1; 
 
-    return ret_val
+def load_library():
+    global tof_lib, i2c_transport, read_func, write_func
+    if tof_lib is not None:
+        return tof_lib
 
-# Load VL53L0X shared lib 
-tof_lib = CDLL("./lib/vl53l0x_python.so")
+    # i2c bus transport. Its read/write methods are handed straight to the C
+    # library as the i2c callbacks, see lib/i2c_transport.py
+    i2c_transport = open_transport(1)
 
-# Create read function pointer
-READFUNC = CFUNCTYPE(c_int, c_ubyte, c_ubyte, POINTER(c_ubyte), c_ubyte)
-read_func = READFUNC(i2c_read)
+    # Load VL53L0X shared lib
+    library = CDLL("./lib/vl53l0x_python.so")
 
-# Create write function pointer
-WRITEFUNC = CFUNCTYPE(c_int, c_ubyte, c_ubyte, POINTER(c_ubyte), c_ubyte)
-write_func = WRITEFUNC(i2c_write)
+    # Create read and write function pointers
+    read_func = READFUNC(i2c_transport.read)
+    write_func = WRITEFUNC(i2c_transport.write)
 
-# pass i2c read and write function pointers to VL53L0X library
-tof_lib.VL53L0X_set_i2c(read_func, write_func)
+    # pass i2c read and write function pointers to VL53L0X library
+    library.VL53L0X_set_i2c(read_func, write_func)
+    tof_lib = library
+    return tof_lib
 
 class VL53L0X(object):
     """VL53L0X ToF."""
@@ -85,6 +73,7 @@ class VL53L0X(object):
 
     def __init__(self, address=0x29, TCA9548A_Num=255, TCA9548A_Addr=0, **kwargs):
         """Initialize the VL53L0X ToF Sensor from ST"""
+        load_library()
         self.device_address = address
         self.TCA9548A_Device = TCA9548A_Num
         self.TCA9548A_Address = TCA9548A_Addr
@@ -0,0 +1,96 @@
+import time
+from collections import deque
+
+
+class ApproachDetector:
+    """Decides whether someone is in front of the mirror from filtered distances.
+
+    Separate enter and exit thresholds, each of which has to hold for a
+    minimum dwell time, keep someone standing right at the threshold from
+    flapping the mirror on and off. Velocity is estimated from recent
+    samples, so a visitor walking towards the mirror can be flagged as
+    approaching shortly before they cross the enter threshold.
+    """
+
+    def __init__(self, enter_threshold, exit_threshold=None, enter_dwell=0.0, exit_dwell=0.0,
+                 prewarm_speed=200, prewarm_lead=1.5, velocity_window=0.6):
+        self.enter_threshold = enter_threshold  # mm
+        self.exit_threshold = exit_threshold if exit_threshold is not None else enter_threshold  # mm
+        self.enter_dwell = enter_dwell  # seconds
+        self.exit_dwell = exit_dwell  # seconds
+        self.prewarm_speed = prewarm_speed  # mm/s towards the mirror before we call it an approach
+        self.prewarm_lead = prewarm_lead  # seconds before the predicted crossing to flag it
+        self.velocity_window = velocity_window  # seconds of history used for velocity
+        self.present = False
+        self.approaching = False
+        self.velocity = 0.0  # mm/s, negative when moving towards the mirror
+        self.distance = None
+        self._crossed_at = None  # when the distance first crossed the threshold we're waiting on
+        self._history = deque()
+
+    def update(self, distance, now=None):
+        """Feed the latest filtered distance.
+
+        Returns True when this sample started an approach, i.e. it's time to
+        pre-warm.
+        """
+        if now is None:
+            now = time.monotonic()
+
+        self.distance = distance
+        self._update_velocity(distance, now)
+
+        if self.present:
+            crossed = distance > self.exit_threshold
+            dwell = self.exit_dwell
+        else:
+            crossed = distance < self.enter_threshold
+            dwell = self.enter_dwell
+
+        if not crossed:
+            self._crossed_at = None
+        else:
+            if self._crossed_at is None:
+                self._crossed_at = now
+            if now - self._crossed_at >= dwell:
+                self.present = not self.present
+                self._crossed_at = None
+
+        return self._update_approaching(distance)
+
+    def time_to_enter(self):
+        """Predicted seconds until the enter threshold is crossed, or None if not heading there."""
+        if self.distance is None or self.velocity >= 0:
+            return None
+        return max(self.distance - self.enter_threshold, 0) / -self.velocity
+
+    def _update_approaching(self, distance):
+        was_approaching = self.approaching
+
+        eta = self.time_to_enter()
+        self.approaching = (not self.present and
+                            distance >= self.enter_threshold and
+                            -self.velocity >= self.prewarm_speed and
+                            eta is not None and eta <= self.prewarm_lead)
+
+        return self.approaching and not was_approaching
+
+    # Least squares slope over the samples in the velocity window
+    def _update_velocity(self, distance, now):
+        history = self._history
+        history.append((now, distance))
+        while now - history[0][0] > self.velocity_window:
+            history.popleft()
+
+        n = len(history)
+        if n < 2:
+            self.velocity = 0.0
+            return
+
+        mean_t = sum(t for t, _ in history) / n
+        mean_d = sum(d for _, d in history) / n
+        var_t = sum((t - mean_t) ** 2 for t, _ in history)
+        if var_t == 0:
+            self.velocity = 0.0
+            return
+        self.velocity = sum((t - mean_t) * (d - mean_d) for t, d in history) / var_t
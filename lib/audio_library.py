@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+from collections import namedtuple
+from random import *
+import mutagen
+from mutagen import mp3
+from logger import Logger
+
+# What the mixer needs to know about a track, cached so we never have to
+# open the file again to find out
+AudioInfo = namedtuple('AudioInfo', ['sample_rate', 'channels', 'length'])
+
+IGNORED_FILES = ['mute_audio.lock']
+
+
+class AudioLibrary:
+    """In-memory index of the playable tracks in the audio directory.
+
+    Track metadata is persisted to a JSON index keyed by file name, size and
+    mtime, so mutagen only has to open files that are new or have changed.
+    Refreshes can run in the background; readers always see a complete
+    snapshot of the last finished scan.
+    """
+
+    def __init__(self, audio_dir, index_path):
+        self.audio_dir = audio_dir
+        self.index_path = index_path
+        self.thr = None
+        self.tracks = {}  # full path -> AudioInfo, playable tracks only
+        self._entries = {}  # file name -> index entry
+        self._lock = threading.Lock()
+        self._load_index()
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def choice(self, prefer=None):
+        """Return a random (filename, AudioInfo), or None if there's nothing to play.
+
+        prefer, if given, is called with the tracks and returns the subset to
+        choose from.
+        """
+        tracks = self.tracks
+        if prefer is not None:
+            tracks = prefer(tracks)
+        if len(tracks) == 0:
+            return None
+        return choice(list(tracks.items()))
+
+    def refresh(self):
+        """Rescan the audio directory, probing only new or changed files."""
+        with self._lock:
+            entries = {}
+            probed = 0
+
+            try:
+                listing = list(os.scandir(self.audio_dir))
+            except OSError as err:
+                Logger.write.error('Unable to scan ' + self.audio_dir + ': ' + str(err))
+                return
+
+            for dir_entry in listing:
+                if dir_entry.name.startswith('.') or dir_entry.name in IGNORED_FILES:
+                    continue
+                if not dir_entry.is_file():
+                    continue
+
+                stat = dir_entry.stat()
+                entry = self._entries.get(dir_entry.name)
+                if entry is None or entry.get('size') != stat.st_size or entry.get('mtime') != stat.st_mtime_ns:
+                    entry = self.probe(dir_entry.path)
+                    entry['size'] = stat.st_size
+                    entry['mtime'] = stat.st_mtime_ns
+                    probed += 1
+
+                entries[dir_entry.name] = entry
+
+            changed = probed > 0 or entries.keys() != self._entries.keys()
+            self._entries = entries
+            self.tracks = self._playable(entries)
+
+            if changed:
+                self._save_index()
+                Logger.write.info('Loaded ' + str(len(self.tracks)) + ' music files (' + str(probed) + ' probed)')
+
+    def refresh_async(self):
+        if self.thr is not None:
+            if self.thr.is_alive():
+                return
+        self.thr = LibraryThread(0, 'refresh', self)
+        self.thr.start()
+
+    @staticmethod
+    def probe(file):
+        entry = {'valid': False, 'sample_rate': 0, 'channels': 0, 'length': 0}
+        try:
+            audio = mutagen.File(file)
+        except (mutagen.MutagenError, OSError) as err:
+            Logger.write.warning('Unable to read ' + file + ': ' + str(err))
+            return entry
+
+        if type(audio) is not mutagen.mp3.MP3:
+            Logger.write.warning("Invalid audio type '" + str(type(audio)) + "' for " + file)
+            return entry
+
+        entry['valid'] = True
+        entry['sample_rate'] = audio.info.sample_rate
+        entry['channels'] = audio.info.channels
+        entry['length'] = audio.info.length
+        return entry
+
+    def _playable(self, entries):
+        tracks = {}
+        for name, entry in entries.items():
+            if entry['valid']:
+                tracks[os.path.join(self.audio_dir, name)] = AudioInfo(
+                    entry['sample_rate'], entry['channels'], entry['length'])
+        return tracks
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as index_file:
+                entries = json.load(index_file)['files']
+            tracks = self._playable(entries)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as err:
+            Logger.write.warning('Ignoring unreadable audio index ' + self.index_path + ': ' + str(err))
+            return
+
+        self._entries = entries
+        self.tracks = tracks
+        Logger.write.info('Indexed ' + str(len(self.tracks)) + ' music files')
+
+    def _save_index(self):
+        # Write then rename so a power cut can't leave a half written index
+        tmp_path = self.index_path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as index_file:
+                json.dump({'files': self._entries}, index_file)
+            os.replace(tmp_path, self.index_path)
+        except OSError as err:
+            Logger.write.warning('Unable to save audio index ' + self.index_path + ': ' + str(err))
+
+
+class LibraryThread(threading.Thread):
+    def __init__(self, thread_id, name, library):
+        threading.Thread.__init__(self)
+        self.threadID = thread_id
+        self.name = name
+        self.library = library
+
+    def run(self):
+        self.library.refresh()
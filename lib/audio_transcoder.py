@@ -0,0 +1,132 @@
+import math
+import os
+import subprocess
+import sys
+import wave
+from array import array
+from logger import Logger
+
+# Everything in the PCM cache is stored in this one format, so the mixer is
+# opened once and never has to be reopened for an odd sample rate
+PCM_FREQUENCY = 44100
+PCM_CHANNELS = 2
+PCM_FORMAT = (PCM_FREQUENCY, PCM_CHANNELS)
+PCM_EXT = '.wav'
+# Loudness envelope stored next to each PCM file: one byte per step, the
+# RMS level of that slice of the track scaled so its loudest step is 255
+ENVELOPE_EXT = '.env'
+ENVELOPE_RATE = 50  # steps per second
+
+
+class AudioTranscoder:
+    """Sidecar cache of the audio library decoded to uniform PCM WAV files.
+
+    Decoding is done ahead of time with ffmpeg (see prepare_audio.py), so
+    starting a track only has to read raw samples off the disk. A loudness
+    envelope of each file is saved alongside it for effects that follow the
+    music.
+    """
+
+    def __init__(self, audio_dir, pcm_dir):
+        self.audio_dir = audio_dir
+        self.pcm_dir = pcm_dir
+
+    def path_for(self, source):
+        name = os.path.splitext(os.path.basename(source))[0]
+        return os.path.join(self.pcm_dir, name + PCM_EXT)
+
+    @staticmethod
+    def envelope_path_for(pcm_file):
+        return os.path.splitext(pcm_file)[0] + ENVELOPE_EXT
+
+    def envelope(self, pcm_file):
+        """The loudness envelope saved for pcm_file, as bytes, or None if there isn't one."""
+        try:
+            with open(self.envelope_path_for(pcm_file), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def lookup(self, source):
+        """Return the cached PCM file for source, or None if missing or stale."""
+        target = self.path_for(source)
+        try:
+            if os.stat(target).st_mtime_ns >= os.stat(source).st_mtime_ns:
+                return target
+        except OSError:
+            pass
+        return None
+
+    def transcode(self, source):
+        target = self.path_for(source)
+        tmp_target = target + '.tmp' + PCM_EXT
+        command = [
+            'ffmpeg', '-nostdin', '-y', '-loglevel', 'error',
+            '-i', source,
+            '-ar', str(PCM_FREQUENCY), '-ac', str(PCM_CHANNELS), '-c:a', 'pcm_s16le',
+            tmp_target
+        ]
+
+        try:
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        except (OSError, subprocess.CalledProcessError) as err:
+            Logger.write.warning('Unable to transcode ' + source + ': ' + str(err))
+            if os.path.exists(tmp_target):
+                os.remove(tmp_target)
+            return None
+
+        os.replace(tmp_target, target)
+        self.save_envelope(target)
+        return target
+
+    def save_envelope(self, pcm_file):
+        tmp_path = self.envelope_path_for(pcm_file) + '.tmp'
+        try:
+            levels = measure_envelope(pcm_file)
+            with open(tmp_path, 'wb') as f:
+                f.write(levels)
+            os.replace(tmp_path, self.envelope_path_for(pcm_file))
+        except (OSError, wave.Error) as err:
+            Logger.write.warning('Unable to measure ' + pcm_file + ': ' + str(err))
+
+    def transcode_all(self, sources):
+        """Bring the cache up to date with sources. Returns how many were transcoded."""
+        os.makedirs(self.pcm_dir, exist_ok=True)
+        transcoded = 0
+        for source in sources:
+            pcm_file = self.lookup(source)
+            if pcm_file is None:
+                if self.transcode(source) is not None:
+                    transcoded += 1
+            elif not os.path.exists(self.envelope_path_for(pcm_file)):
+                # Cached before envelopes were saved
+                self.save_envelope(pcm_file)
+
+        # Drop cached files whose source is gone
+        wanted = set(self.path_for(source) for source in sources)
+        wanted.update([self.envelope_path_for(path) for path in wanted])
+        for entry in os.scandir(self.pcm_dir):
+            if (entry.name.endswith(PCM_EXT) or entry.name.endswith(ENVELOPE_EXT)) and entry.path not in wanted:
+                os.remove(entry.path)
+
+        return transcoded
+
+
+def measure_envelope(pcm_file, rate=ENVELOPE_RATE):
+    """RMS level of every 1/rate seconds of a 16 bit PCM WAV file, scaled to 0 - 255."""
+    with wave.open(pcm_file, 'rb') as wav:
+        if wav.getsampwidth() != 2:
+            raise wave.Error('expected 16 bit samples')
+        step = max(wav.getframerate() // rate, 1)
+        levels = []
+        while True:
+            samples = array('h', wav.readframes(step))
+            if len(samples) == 0:
+                break
+            if sys.byteorder == 'big':
+                samples.byteswap()
+            levels.append(math.sqrt(sum(s * s for s in samples) / len(samples)))
+    loudest = max(levels, default=0.0)
+    if loudest == 0:
+        return bytes(len(levels))
+    return bytes(int(round(255 * level / loudest)) for level in levels)
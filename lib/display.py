@@ -7,10 +7,14 @@ from lib.mirror_text import MirrorText
 
 
 class MirrorDisplay(object):
-    def __init__(self, basepath, fullscreen=True):
+    def __init__(self, basepath, fullscreen=True, dirty_rects=True, scheduler=None):
         self.basepath = basepath
+        # When set, only push the regions that changed to the display
+        # instead of flipping the whole screen every frame
+        self.dirty_rects = dirty_rects
+        self.last_rect = None
 
-        pygame.init()
+        # pygame.init() is up to the caller, it's only done once at startup
         pygame.mouse.set_visible(False)
 
         if fullscreen:
@@ -28,7 +32,36 @@ class MirrorDisplay(object):
         # mirror_text = MirrorText(self._screen)
         Logger.write.info("MirrorDisplay ready!")
 
-        self.mirror_text = MirrorText(self.basepath, self._screen)
+        self.mirror_text = MirrorText(self.basepath, self, scheduler)
+
+    @property
+    def screen(self):
+        return self._screen
+
+    def present(self, rect=None):
+        """Push the current frame to the display.
+
+        The region presented last time is cleared when it differs from rect,
+        so the outgoing phrase doesn't linger. With dirty rects enabled only
+        those two regions are sent to the display; passing no rect, or running
+        with dirty rects disabled, falls back to a full screen flip.
+        """
+        rects = [rect]
+        if self.last_rect is not None and self.last_rect != rect:
+            self._screen.fill(Color.black.value, self.last_rect)
+            rects.append(self.last_rect)
+        self.last_rect = rect
+
+        if not self.dirty_rects or rect is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
+
+    def load(self):
+        self.mirror_text.load()
+
+    def prepare(self):
+        self.mirror_text.prepare()
 
     def run(self):
         self.mirror_text.run()
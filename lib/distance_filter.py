@@ -0,0 +1,102 @@
+import threading
+from array import array
+from bisect import bisect_left, insort
+
+ESTIMATORS = ['mean', 'median', 'trimmed', 'ema']
+MAX_DISTANCE = 65535  # array('H') limit, well past anything the ToF sensor reports
+
+
+class DistanceFilter:
+    """Fixed-size ring buffer of distance samples with running estimators.
+
+    mean and ema are O(1) to read and update. A sorted copy of the window is
+    kept up to date on every add: an O(log n) search plus an O(n) shift of
+    the list for the insert and the removal, which is fine for windows of a
+    few dozen samples. That makes median an O(1) read and trimmed mean only
+    has to sum the trimmed tails. Reads happen under the same lock as writes
+    and never copy the window.
+    """
+
+    def __init__(self, size, estimator='mean', trim=0.2, ema_alpha=0.3):
+        if estimator not in ESTIMATORS:
+            raise ValueError("Unknown estimator '" + str(estimator) + "', expected one of " + str(ESTIMATORS))
+
+        self.size = size
+        self.estimator = estimator
+        self.trim = trim  # fraction dropped from each end for the trimmed mean
+        self.ema_alpha = ema_alpha
+        self.count = 0
+        self._samples = array('H', [0] * size)
+        self._sorted = []
+        self._index = 0
+        self._sum = 0
+        self._ema = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def full(self):
+        return self.count >= self.size
+
+    def add(self, value):
+        value = min(max(int(value), 0), MAX_DISTANCE)
+
+        with self._lock:
+            if self.count == self.size:
+                oldest = self._samples[self._index]
+                self._sum -= oldest
+                del self._sorted[bisect_left(self._sorted, oldest)]
+            else:
+                self.count += 1
+
+            self._samples[self._index] = value
+            self._index = (self._index + 1) % self.size
+            self._sum += value
+            insort(self._sorted, value)
+
+            if self._ema is None:
+                self._ema = float(value)
+            else:
+                self._ema += self.ema_alpha * (value - self._ema)
+
+    def estimate(self):
+        """The current distance according to the configured estimator, or None if empty."""
+        with self._lock:
+            if self.count == 0:
+                return None
+            if self.estimator == 'median':
+                return self._median()
+            if self.estimator == 'trimmed':
+                return self._trimmed_mean()
+            if self.estimator == 'ema':
+                return self._ema
+            return self._sum / self.count
+
+    def mean(self):
+        with self._lock:
+            return self._sum / self.count if self.count else None
+
+    def median(self):
+        with self._lock:
+            return self._median() if self.count else None
+
+    def trimmed_mean(self):
+        with self._lock:
+            return self._trimmed_mean() if self.count else None
+
+    def ema(self):
+        return self._ema
+
+    def _median(self):
+        middle = self.count // 2
+        if self.count % 2:
+            return float(self._sorted[middle])
+        return (self._sorted[middle - 1] + self._sorted[middle]) / 2
+
+    def _trimmed_mean(self):
+        k = int(self.count * self.trim)
+        if k == 0:
+            return self._sum / self.count
+        total = self._sum - sum(self._sorted[:k]) - sum(self._sorted[self.count - k:])
+        return total / (self.count - 2 * k)
@@ -1,72 +1,294 @@
 import time
 import lib.VL53L0X as VL53L0X
-from array import array
-import statistics
+from lib import metrics
+from lib.approach_detector import ApproachDetector
+from lib.distance_filter import DistanceFilter
+from lib.scheduler import Scheduler
 from logger import Logger
-import threading
+
+DEFAULT_INTERVAL = 0.1  # seconds between reads if the sensor won't report its timing budget
+ACTIVE_HOLD = 3.0  # seconds of quiet before dropping back to the idle mode
+MAX_CONSECUTIVE_ERRORS = 10  # failed reads in a row before a sensor is left out of the fused reading
+HEALTH_LOG_INTERVAL = 300  # seconds between sensor health reports
+
+# A single VL53L0X at its default address with no multiplexer
+DEFAULT_SENSORS = [{'address': 0x29}]
+
+READ_TIME = metrics.histogram('dme.read')
+READ_ERRORS = metrics.counter('dme.read_errors')
+
+
+class RangingSensor:
+    """One VL53L0X along with its own sample window and health counters."""
+
+    def __init__(self, name, tof, sample_count, estimator):
+        self.name = name
+        self.tof = tof
+        self.distances = DistanceFilter(sample_count, estimator)
+        self.reads = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.last_distance = None
+        self.read_time = 0.0  # total seconds spent in get_distance()
+        self.max_read_time = 0.0
+
+    def read(self):
+        started = time.monotonic()
+        distance = self.tof.get_distance()
+        elapsed = time.monotonic() - started
+
+        self.reads += 1
+        self.read_time += elapsed
+        self.max_read_time = max(self.max_read_time, elapsed)
+        READ_TIME.observe(elapsed)
+
+        # The sensor reports failed measurements as zero or negative
+        if distance > 0:
+            was_healthy = self.healthy()
+            self.consecutive_errors = 0
+            self.last_distance = distance
+            self.distances.add(distance)
+            if not was_healthy:
+                Logger.write.info('Distance sensor ' + self.name + ' recovered')
+        else:
+            self.errors += 1
+            self.consecutive_errors += 1
+            READ_ERRORS.inc()
+            if self.consecutive_errors == MAX_CONSECUTIVE_ERRORS:
+                Logger.write.warning('Distance sensor ' + self.name + ' failed ' + str(self.consecutive_errors) +
+                                     ' reads in a row, leaving it out')
+        return distance
+
+    def healthy(self):
+        return self.consecutive_errors < MAX_CONSECUTIVE_ERRORS
+
+    def ready(self):
+        return self.healthy() and self.distances.full()
+
+    def estimate(self):
+        return self.distances.estimate()
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'reads': self.reads,
+            'errors': self.errors,
+            'healthy': self.healthy(),
+            'last_distance': self.last_distance,
+            'estimate': self.estimate(),
+            'avg_read_ms': round(self.read_time / self.reads * 1000, 2) if self.reads else None,
+            'max_read_ms': round(self.max_read_time * 1000, 2)
+        }
 
 
 class DME:
-    def __init__(self, threshold, sample_count):
-        self.thr = None
-        self.stopping = False
-        self.tof = VL53L0X.VL53L0X()
+    # Ranging modes from the ST library, by the names used in our config
+    MODES = {
+        'good': VL53L0X.VL53L0X_GOOD_ACCURACY_MODE,
+        'better': VL53L0X.VL53L0X_BETTER_ACCURACY_MODE,
+        'best': VL53L0X.VL53L0X_BEST_ACCURACY_MODE,
+        'long_range': VL53L0X.VL53L0X_LONG_RANGE_MODE,
+        'high_speed': VL53L0X.VL53L0X_HIGH_SPEED_MODE
+    }
+
+    def __init__(self, threshold, sample_count, estimator='mean', detector=None,
+                 mode='good', active_mode=None, idle_interval=0.0, sensors=None, tof_factory=None,
+                 scheduler=None):
+        if mode not in DME.MODES or (active_mode is not None and active_mode not in DME.MODES):
+            raise ValueError('Unknown ranging mode, expected one of ' + str(list(DME.MODES.keys())))
+
+        # Reads block in the ST library for up to a timing budget, so the
+        # sampling task shouldn't share a scheduler with anything that draws
+        self.scheduler = scheduler if scheduler is not None else Scheduler('dme')
+        self.task = None
         self.distance_threshold = threshold
         self.sample_count = sample_count
-        self.distances = array('H')
-        self.tof.start_ranging(VL53L0X.VL53L0X_GOOD_ACCURACY_MODE)
+
+        # Each sensor is a dict with an I2C 'address' and, when it sits
+        # behind a TCA9548A multiplexer, the mux 'tca_num' channel and 'tca_addr'.
+        # tof_factory is called with those to create the sensor objects, e.g.
+        # to substitute lib.simulation.FakeToF
+        if tof_factory is None:
+            tof_factory = VL53L0X.VL53L0X
+        self.sensors = []
+        for index, spec in enumerate(sensors if sensors is not None else DEFAULT_SENSORS):
+            tof = tof_factory(spec.get('address', 0x29), spec.get('tca_num', 255), spec.get('tca_addr', 0))
+            self.sensors.append(RangingSensor(spec.get('name', str(index)), tof, sample_count, estimator))
+
+        # Without a tuned detector, behave like a plain threshold
+        self.detector = detector if detector is not None else ApproachDetector(threshold)
+        # Sample in idle_mode while nobody is around and switch to
+        # active_mode (if set) while someone is approaching or present
+        self.idle_mode = mode
+        self.active_mode = active_mode
+        self.idle_interval = idle_interval
+        self.requested_mode = mode
+        self.mode = None
+        self.interval = DEFAULT_INTERVAL
+        self.last_active = 0
+        self.last_health_log = time.monotonic()
+        self.start_ranging(mode)
         self.ready = False
+        self.last_state = False
+        self.on_change = None  # called from the DME thread with the new in_range() state
+        self.on_approach = None  # called from the DME thread when someone starts walking up
 
     def cleanup(self):
-        self.tof.stop_ranging()
+        for sensor in self.sensors:
+            sensor.tof.stop_ranging()
+
+    def start_ranging(self, mode):
+        budget = 0
+        for sensor in self.sensors:
+            sensor.tof.start_ranging(DME.MODES[mode])
+            budget = max(budget, sensor.tof.get_timing())
+        self.mode = mode
+        # The timing budget is how long one measurement takes, there's no
+        # point asking for distances any faster than that. All of the sensors
+        # range at the same time, so one pass costs the slowest budget.
+        self.interval = budget / 1000000 if budget > 0 else DEFAULT_INTERVAL
+        Logger.write.info('Ranging ' + str(len(self.sensors)) + ' sensor(s) in ' + mode + ' mode, ' +
+                          str(round(self.interval * 1000)) + 'ms per sample')
+
+    def set_mode(self, mode):
+        """Ask the sampling thread to switch ranging mode before its next read."""
+        if mode not in DME.MODES:
+            raise ValueError("Unknown ranging mode '" + str(mode) + "'")
+        self.requested_mode = mode
+
+    def sample_interval(self):
+        if self.mode == self.idle_mode:
+            return max(self.interval, self.idle_interval)
+        return self.interval
+
+    def update_mode(self):
+        if self.active_mode is None:
+            return
+
+        now = time.monotonic()
+        detector = self.detector
+        if detector.present or detector.velocity <= -detector.prewarm_speed / 2:
+            self.last_active = now
+            self.set_mode(self.active_mode)
+        elif now - self.last_active > ACTIVE_HOLD:
+            self.set_mode(self.idle_mode)
+
+    def fused(self):
+        """The closest distance seen by any healthy, warmed up sensor, or None."""
+        estimates = [sensor.estimate() for sensor in self.sensors if sensor.ready()]
+        if len(estimates) == 0:
+            return None
+        return min(estimates)
 
     def average(self):
-        return int(statistics.mean(self.distances))
+        distance = self.fused()
+        return int(distance) if distance is not None else None
+
+    def nearest(self):
+        """Return (sensor name, distance) for the sensor seeing the closest object, or None."""
+        best = None
+        for sensor in self.sensors:
+            if sensor.ready():
+                distance = sensor.estimate()
+                if best is None or distance < best[1]:
+                    best = (sensor.name, distance)
+        return best
+
+    def position(self):
+        """Where along the sensor array the visitor is, from 0.0 (first sensor) to 1.0 (last).
+
+        Sensors are weighted by how close their reading is. Returns None if
+        no sensor sees anything inside the exit threshold.
+        """
+        total = 0.0
+        weighted = 0.0
+        for index, sensor in enumerate(self.sensors):
+            if not sensor.ready():
+                continue
+            distance = sensor.estimate()
+            if distance >= self.detector.exit_threshold:
+                continue
+            weight = 1.0 / max(distance, 1)
+            total += weight
+            weighted += weight * index
+        if total == 0:
+            return None
+        if len(self.sensors) == 1:
+            return 0.0
+        return weighted / total / (len(self.sensors) - 1)
 
     def instant(self):
-        return self.tof.get_distance()
+        """Read every sensor once and return the raw distances."""
+        return [sensor.read() for sensor in self.sensors]
+
+    def health(self):
+        return [sensor.stats() for sensor in self.sensors]
 
     def in_range(self):
-        if len(self.distances) < self.sample_count:
-            Logger.write.info('Not enough samples (' + str(len(self.distances)) + '/' + str(self.sample_count) + ')')
+        if not any(sensor.ready() for sensor in self.sensors):
+            healthy = [sensor for sensor in self.sensors if sensor.healthy()]
+            # Polled every read, so rate limited. All sensors failing isn't
+            # warm-up, say so rather than waiting for samples that won't come.
+            if len(healthy) == 0:
+                Logger.write.warning('No healthy distance sensors, all %d failing', len(self.sensors),
+                                     extra={'rate_limit': 10.0})
+            else:
+                Logger.write.info('Not enough samples (%d/%d)', max(len(sensor.distances) for sensor in healthy),
+                                  self.sample_count, extra={'rate_limit': 1.0})
             return False
         else:
             if not self.ready:
                 self.ready = True
-                Logger.write.info(
-                    'Sample threshold reached (' + str(len(self.distances)) + '/' + str(self.sample_count) + ')')
-            return self.average() < self.distance_threshold
+                Logger.write.info('Sample threshold reached (' + str(self.sample_count) + ')')
+            return self.detector.present
 
-    def stop(self):
-        self.stopping = True
-
-    def run(self):
-        if self.thr is not None:
-            if self.thr.isAlive():
-                return
-        self.thr = DMEThread(0, 'loop', self)
-        self.stopping = False
-        self.thr.start()
+    def notify(self):
+        distance = self.average()
+        if distance is not None:
+            if self.detector.update(distance) and self.on_approach is not None:
+                self.on_approach()
+            self.update_mode()
 
-    def loop(self):
-        while not self.stopping:
-            distance = self.instant()
-            if len(self.distances) >= self.sample_count:
-                self.distances.pop(0)
+        state = self.in_range()
+        if state != self.last_state:
+            self.last_state = state
+            if self.on_change is not None:
+                self.on_change(state)
 
-            self.distances.append(distance)
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
 
-            time.sleep(0.1)
+    def run(self):
+        if self.task is not None and self.task.running():
+            return
+        self.task = self.scheduler.spawn('dme', self.loop)
 
-        self.cleanup()
+    def loop(self, token):
+        next_read = time.monotonic()
+        try:
+            while not token.cancelled:
+                if self.requested_mode != self.mode:
+                    self.cleanup()
+                    self.start_ranging(self.requested_mode)
 
+                # Every sensor is ranging continuously, so reading them back to
+                # back costs about one timing budget for the whole array
+                self.instant()
+                self.notify()
 
-class DMEThread(threading.Thread):
-    def __init__(self, thread_id, name, tof_sensor):
-        threading.Thread.__init__(self)
-        self.threadID = thread_id
-        self.name = name
-        self.tof_sensor = tof_sensor
+                now = time.monotonic()
+                if now - self.last_health_log > HEALTH_LOG_INTERVAL:
+                    self.last_health_log = now
+                    Logger.write.info('Distance sensor health: ' + str(self.health()))
 
-    def run(self):
-        self.tof_sensor.loop()
+                # Pace against absolute deadlines so the read time doesn't add
+                # to the interval; if we've fallen behind, just start over
+                next_read += self.sample_interval()
+                if next_read > now:
+                    yield next_read
+                else:
+                    next_read = now
+                    yield None
+        finally:
+            self.cleanup()
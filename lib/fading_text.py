@@ -1,9 +1,15 @@
 import time
 from random import *
-import threading
 import pygame
 from logger import Logger
+from lib import metrics
 from lib.color import Color
+from lib.frame_clock import FrameClock
+from lib.render_cache import RenderCache
+from lib.text_wrap import wrap_text
+
+DRAW_TIME = metrics.histogram('display.draw')
+FIRST_FRAME = metrics.stopwatch('activation.first_frame')
 
 
 class FadingText:
@@ -13,11 +19,12 @@ class FadingText:
     MARGIN = 0.10
     FADE_IN_EASING = lambda x: x  # Linear
     FADE_OUT_EASING = lambda x: x  # Linear
+    FRAME_RATE = 30  # Target fps while fading
+    VSYNC = False  # Set if display.flip() blocks on vblank
 
-    def __init__(self, screen, fontlib, text, center_text=False):
-        self.thr = None
-        self.stopping = False
-        self.screen = screen
+    def __init__(self, display, fontlib, text, center_text=False, render_cache=None):
+        self.display = display
+        self.screen = display.screen
         self.text = text
         self.center_text = center_text
         self.state = None
@@ -26,44 +33,33 @@ class FadingText:
         self.state_time = time.time()
         self.last_state_change = time.time()
         self.font = choice(fontlib)
+        # Display geometry and font metrics don't change for the life of
+        # this text, so look them up once instead of every frame
+        self.screen_size = self.screen.get_size()
+        self.font_height = self.font.size('Tg')[1]
+        self.render_cache = render_cache if render_cache is not None else RenderCache()
         self.rendered_text = []
-        self.drawing_surface = None
+        self.drawing_surface = None  # Pre-composited text layer, built in predraw()
+        self.clock = FrameClock(FadingText.FRAME_RATE, vsync=FadingText.VSYNC)
         self.predraw()
 
-    def fade(self, direction, fade_interval):
-        if self.thr is not None:
-            if self.thr.isAlive():
-                return
+    # fade_in() and fade_out() are scheduler tasks (see lib.scheduler): they
+    # draw one frame per step and yield when the next one is due
 
-        if direction == FadingText.ST_FADEIN:
-            self.thr = FadeThread(0, 'fade_in', self, fade_interval)
-            self.thr.start()
-            self.thr.join()
-        elif direction == FadingText.ST_FADEOUT:
-            self.thr = FadeThread(0, 'fade_out', self, fade_interval)
-            self.thr.start()
-            self.thr.join()
-        else:
-            return
-
-    def stop(self):
-        Logger.write.debug(self.__class__.__name__)
-        self.stopping = True
-
-    def fade_in(self, fade_interval):
+    def fade_in(self, fade_interval, token=None):
+        """Fade in over fade_interval seconds, giving up if token is cancelled."""
         if self.alpha >= 1.0:
             return
 
-        self.stopping = False
-
         last_state_change = time.time()
         adv_offset = 0
 
         if self.alpha < 1.0:
             adv_offset = self.alpha * fade_interval
 
+        self.clock.start()
         while self.alpha < 1.0:
-            if self.stopping:
+            if token is not None and token.cancelled:
                 Logger.write.debug("stop request ack")
                 return
 
@@ -71,16 +67,17 @@ class FadingText:
             self.alpha = FadingText.FADE_IN_EASING(1.0 * state_time / fade_interval)
 
             self.draw()
+            yield self.clock.advance()
 
+        self.log_frame_stats()
         self.state = FadingText.ST_FADEIN
         self.alpha = 1.0
 
-    def fade_out(self, fade_interval):
+    def fade_out(self, fade_interval, token=None):
+        """Fade out over fade_interval seconds, giving up if token is cancelled."""
         if self.alpha <= 0.0:
             return
 
-        self.stopping = False
-
         last_state_change = time.time()
         adv_offset = 0
         # If we're not completely transparent, artifically pretend that
@@ -89,8 +86,9 @@ class FadingText:
         if self.alpha > 0.0:
             adv_offset = fade_interval - self.alpha * fade_interval
 
+        self.clock.start()
         while self.alpha > 0.0:
-            if self.stopping:
+            if token is not None and token.cancelled:
                 Logger.write.debug("stop request ack")
                 return
 
@@ -98,90 +96,89 @@ class FadingText:
             self.alpha = 1. - FadingText.FADE_OUT_EASING(1.0 * state_time / fade_interval)
 
             self.draw()
+            yield self.clock.advance()
 
+        self.log_frame_stats()
         self.state = FadingText.ST_FADEOUT
         self.alpha = 0.0
 
+    def log_frame_stats(self):
+        Logger.write.debug('Fade rendered %d frames at %.1f fps, dropped %d',
+                           self.clock.frames, self.clock.actual_fps(), self.clock.dropped)
+
     # Use predraw in the constructor
     # so that we only have to do this work one time
     def predraw(self):
-        # see http://pygame.org/wiki/TextWrap
-        lines = self.text.splitlines()
-        y = 0
-        screen_w, screen_h = pygame.display.Info().current_w, pygame.display.Info().current_h
+        box = FadingText.wrap_box(self.screen_size)
+        lines = self.render_cache.layout(self.font, self.text, box, FadingText.wrap)
 
-        screen_w = int(screen_w * (1 - FadingText.MARGIN))
-        screen_h = int(screen_h * (1 - FadingText.MARGIN))
-
-        font_height = self.font.size('Tg')[1]
-        line_spacing = font_height + FadingText.LINE_SPACING
+        y = 0
+        line_spacing = self.font_height + FadingText.LINE_SPACING
         longest_line_length = 0
 
-        while lines:
-            if y + font_height > screen_h:
-                break
-
-            line = lines.pop(0)
+        for line in lines:
+            rendered_line = self.render_cache.render_line(self.font, line, Color.white.value)
 
-            # render a blank line
-            if len(line) == 0:
-                rendered_line = self.font.render("", True, Color.white.value)
-                self.rendered_text.append(rendered_line)
-                y += line_spacing
+            if rendered_line.get_rect().width > longest_line_length:
+                longest_line_length = rendered_line.get_rect().width
 
-            while line:
-                i = 1
+            self.rendered_text.append(rendered_line)
+            y += line_spacing
 
-                while self.font.size(line[:i])[0] < screen_w and i < len(line):
-                    i += 1
+        if self.center_text:
+            self.position = self.centered(longest_line_length, y, self.screen_size)
+        else:
+            self.position = self.random_position(longest_line_length, y, self.screen_size)
 
-                if i < len(line):
-                    i = line.rfind(" ", 0, i) + 1
+        self.drawing_surface = self.compose(longest_line_length, y)
 
-                rendered_line = self.font.render(line[:i], True, Color.white.value)
+    @staticmethod
+    def wrap_box(screen_size):
+        """The (width, height) text is wrapped into on a screen of screen_size."""
+        screen_w, screen_h = screen_size
+        return int(screen_w * (1 - FadingText.MARGIN)), int(screen_h * (1 - FadingText.MARGIN))
 
-                if rendered_line.get_rect().width > longest_line_length:
-                    longest_line_length = rendered_line.get_rect().width
+    @staticmethod
+    def wrap(font, text, box):
+        """Split text into lines that fit in a (width, height) box."""
+        return wrap_text(font, text, box, font.size('Tg')[1] + FadingText.LINE_SPACING)
 
-                self.rendered_text.append(rendered_line)
-                y += line_spacing
-                line = line[i:]
-            if self.center_text:
-                self.position = self.centered(longest_line_length, y)
-            else:
-                self.position = self.random_position(longest_line_length, y)
+    # Composite all of the lines onto a single opaque layer. Each frame then
+    # only has to change the layer's alpha and blit it once.
+    def compose(self, width, height):
+        layer = pygame.surface.Surface((max(width, 1), max(height, 1))).convert()
+        layer.fill(Color.black.value)
 
-    def draw(self):
-
-        x, y = self.position
-        font_height = self.font.size('Tg')[1]
+        y = 0
+        for rendered_line in self.rendered_text:
+            layer.blit(rendered_line, (0, y))
+            y += self.font_height + FadingText.LINE_SPACING
 
-        # clear the screen
-        screen_w, screen_h = pygame.display.Info().current_w, pygame.display.Info().current_h
-        s2 = pygame.surface.Surface((screen_w, screen_h))
-        self.drawing_surface = s2
-        s2.set_alpha(255 * self.alpha)
-        self.screen.fill(Color.black.value)
+        return layer
 
-        for rendered_line in self.rendered_text:
-            s2.blit(rendered_line, (x, y))
-            y += font_height + FadingText.LINE_SPACING
+    def draw(self):
+        started = time.monotonic()
+        self.drawing_surface.set_alpha(int(255 * min(max(self.alpha, 0.0), 1.0)))
 
-        self.screen.blit(s2, (0, 0))  # always draw onto 0,0 of the screen surface
-        pygame.display.flip()
+        # clear only the area we're about to draw over
+        rect = self.drawing_surface.get_rect(topleft=self.position)
+        self.screen.fill(Color.black.value, rect)
+        self.screen.blit(self.drawing_surface, rect)
+        self.display.present(rect)
+        DRAW_TIME.observe(time.monotonic() - started)
+        FIRST_FRAME.stop()
 
     @staticmethod
-    def centered(r_width, r_height):
-
-        screen_w, screen_h = pygame.display.Info().current_w, pygame.display.Info().current_h
-        x = screen_w / 2 - r_width / 2
-        y = screen_h / 2 - r_height / 2
+    def centered(r_width, r_height, screen_size):
+        screen_w, screen_h = screen_size
+        x = int(screen_w / 2 - r_width / 2)
+        y = int(screen_h / 2 - r_height / 2)
 
         return x, y
 
     @staticmethod
-    def random_position(r_width, r_height):
-        screen_w, screen_h = pygame.display.Info().current_w, pygame.display.Info().current_h
+    def random_position(r_width, r_height, screen_size):
+        screen_w, screen_h = screen_size
         x_margin = int(0.05 * screen_w)
         y_margin = int(0.05 * screen_h)
 
@@ -200,18 +197,3 @@ class FadingText:
             y = min_y
         return x, y
 
-
-class FadeThread(threading.Thread):
-
-    def __init__(self, thread_id, name, fading_text, fade_interval):
-        threading.Thread.__init__(self)
-        self.threadID = thread_id
-        self.name = name
-        self.fading_text = fading_text
-        self.fade_interval = fade_interval
-
-    def run(self):
-        if self.name == 'fade_in':
-            self.fading_text.fade_in(self.fade_interval)
-        elif self.name == 'fade_out':
-            self.fading_text.fade_out(self.fade_interval)
\ No newline at end of file
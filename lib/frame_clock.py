@@ -0,0 +1,84 @@
+import time
+
+DEFAULT_FPS = 30
+DEFAULT_REFRESH_RATE = 60  # Hz, used to estimate the vblank interval when vsync is on
+
+
+class FrameClock:
+    """Paces a render task to a fixed frame rate against absolute deadlines.
+
+    Frames that miss their deadline are counted as dropped and the schedule
+    skips ahead instead of trying to catch up. When the display flips on
+    vsync, the clock wakes one refresh interval early so the flip lands on
+    the vblank closest to the deadline rather than the one after it.
+    """
+
+    def __init__(self, fps=DEFAULT_FPS, vsync=False, refresh_rate=DEFAULT_REFRESH_RATE):
+        self.fps = fps
+        self.frame_time = 1.0 / fps
+        self.vsync = vsync
+        self.vsync_slack = 1.0 / refresh_rate if vsync else 0.0
+        self.frames = 0
+        self.dropped = 0
+        self.late_total = 0.0  # seconds frames started after their deadline, summed
+        self.late_max = 0.0
+        self.started = None
+        self.finished = None  # when the last frame was ticked off
+        self.next_frame = None
+
+    def start(self):
+        self.frames = 0
+        self.dropped = 0
+        self.late_total = 0.0
+        self.late_max = 0.0
+        self.started = time.monotonic()
+        self.next_frame = self.started + self.frame_time
+
+    def advance(self):
+        """Count a rendered frame and return the time.monotonic() at which to
+        start the next one. Call once per frame; scheduler tasks yield the
+        result.
+        """
+        if self.next_frame is None:
+            self.start()
+
+        now = time.monotonic()
+        remaining = self.next_frame - now
+
+        if remaining >= 0:
+            wake_at = self.next_frame - self.vsync_slack
+            self.next_frame += self.frame_time
+        else:
+            # We're late - count the slots we blew through and realign to
+            # the next one in the future
+            self._record_late(-remaining)
+            missed = int(-remaining / self.frame_time)
+            self.dropped += missed
+            self.next_frame += (missed + 1) * self.frame_time
+            wake_at = now
+
+        self.frames += 1
+        self.finished = now
+        return wake_at
+
+    def _record_late(self, late):
+        if late > 0:
+            self.late_total += late
+            self.late_max = max(self.late_max, late)
+
+    def actual_fps(self):
+        if self.started is None or self.frames == 0:
+            return 0.0
+        elapsed = self.finished - self.started
+        if elapsed <= 0:
+            return 0.0
+        return self.frames / elapsed
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'dropped': self.dropped,
+            'fps': round(self.actual_fps(), 1),
+            'avg_late_ms': round(self.late_total / self.frames * 1000, 2) if self.frames else None,
+            'max_late_ms': round(self.late_max * 1000, 2)
+        }
@@ -0,0 +1,214 @@
+import math
+import time
+from abc import ABC, abstractmethod
+from array import array
+from lib.frame_clock import FrameClock
+from lib.neopixel import Color
+
+DEFAULT_FPS = 50
+GAMMA = 2.2  # LED output is linear, perceived brightness isn't
+
+
+def wheel(pos):
+    """Generate rainbow colors across 0-255 positions."""
+    if pos < 85:
+        return Color(pos * 3, 255 - pos * 3, 0)
+    elif pos < 170:
+        pos -= 85
+        return Color(255 - pos * 3, 0, pos * 3)
+    else:
+        pos -= 170
+        return Color(0, pos * 3, 255 - pos * 3)
+
+
+def scale(color, level):
+    """Scale a 24-bit color by level (0.0 - 1.0)."""
+    level = min(max(level, 0.0), 1.0)
+    return Color(int((color >> 16 & 255) * level), int((color >> 8 & 255) * level), int((color & 255) * level))
+
+
+def brightness_tables(gamma=GAMMA):
+    """bytes.translate tables for each brightness level 0 - 255.
+
+    Level is perceived brightness, so table[level] scales every color
+    channel by (level / 255) ** gamma.
+    """
+    tables = []
+    for level in range(256):
+        factor = (level / 255) ** gamma
+        tables.append(bytes(int(round(value * factor)) for value in range(256)))
+    return tables
+
+
+def blank_frame(num_pixels):
+    return array('I', bytes(4 * num_pixels))
+
+
+class Effect(ABC):
+    """Base class for LED effects.
+
+    An effect renders frame number index into a preallocated array('I') of
+    colors. Effects that repeat set period to the number of frames in one
+    cycle; their frames are rendered once by timeline() and played back
+    from memory.
+    """
+    period = None
+
+    def __init__(self, num_pixels, fps):
+        self.num_pixels = num_pixels
+        self.fps = fps
+
+    def frames_for(self, seconds):
+        return max(int(round(seconds * self.fps)), 1)
+
+    @abstractmethod
+    def render(self, index, frame):
+        """Draw frame number index into frame."""
+
+    def timeline(self):
+        """Render one period into a single array and return a view of each frame."""
+        n = self.num_pixels
+        table = blank_frame(n * self.period)
+        frame = blank_frame(n)
+        for index in range(self.period):
+            self.render(index, frame)
+            table[index * n:(index + 1) * n] = frame
+        view = memoryview(table)
+        return [view[index * n:(index + 1) * n] for index in range(self.period)]
+
+
+class RainbowEffect(Effect):
+    """The wheel scrolling across all pixels, one position per frame."""
+    period = 256
+
+    def render(self, index, frame):
+        for i in range(self.num_pixels):
+            frame[i] = wheel((i + index) & 255)
+
+    def timeline(self):
+        # Frame j is wheel((i + j) & 255) for every pixel i, which is just a
+        # window onto the wheel table with enough wrapped entries on the end
+        table = array('I', [wheel(pos & 255) for pos in range(256 + self.num_pixels)])
+        view = memoryview(table)
+        return [view[j:j + self.num_pixels] for j in range(256)]
+
+
+class BreathingEffect(Effect):
+    """Every pixel slowly pulsing a single color."""
+
+    def __init__(self, num_pixels, fps, color=Color(255, 255, 255), seconds=4.0):
+        Effect.__init__(self, num_pixels, fps)
+        self.color = color
+        self.period = self.frames_for(seconds)
+
+    def render(self, index, frame):
+        level = (1 - math.cos(2 * math.pi * index / self.period)) / 2
+        color = scale(self.color, level)
+        for i in range(self.num_pixels):
+            frame[i] = color
+
+
+class ChaseEffect(Effect):
+    """Short fading tails running along the strip."""
+
+    def __init__(self, num_pixels, fps, color=Color(255, 255, 255), length=4, spacing=16, speed=25):
+        Effect.__init__(self, num_pixels, fps)
+        self.color = color
+        self.length = length
+        self.spacing = spacing
+        self.period = self.frames_for(spacing / speed)  # speed is in pixels per second
+        # One lit segment, head first, repeated every spacing pixels
+        self.segment = [scale(color, 1 - d / length) if d < length else 0 for d in range(spacing)]
+
+    def render(self, index, frame):
+        offset = index * self.spacing // self.period
+        segment = self.segment
+        spacing = self.spacing
+        for i in range(self.num_pixels):
+            frame[i] = segment[(offset - i) % spacing]
+
+
+class AudioSyncEffect(Effect):
+    """Slowly cycling color whose brightness follows an audio level.
+
+    level is a callable returning 0.0 - 1.0, e.g. mirror.Sound.level, the
+    loudness of the music at the current play position. It's polled every
+    frame, so this effect is rendered live.
+    """
+
+    def __init__(self, num_pixels, fps, level=None, seconds=10.0):
+        Effect.__init__(self, num_pixels, fps)
+        self.level = level if level is not None else lambda: 1.0
+        self.cycle = self.frames_for(seconds)
+
+    def render(self, index, frame):
+        color = scale(wheel((index * 256 // self.cycle) & 255), self.level())
+        for i in range(self.num_pixels):
+            frame[i] = color
+
+
+EFFECTS = {
+    'rainbow': RainbowEffect,
+    'breathing': BreathingEffect,
+    'chase': ChaseEffect,
+    'audio': AudioSyncEffect
+}
+
+
+class EffectEngine:
+    """Plays the selected effect at a fixed frame rate.
+
+    Frames are paced by a FrameClock, so late and dropped frames and
+    oversleeping show up in stats(). Animation follows the frame slot rather
+    than the number of frames shown, so dropped frames don't slow it down.
+    """
+
+    def __init__(self, num_pixels, fps=DEFAULT_FPS):
+        self.num_pixels = num_pixels
+        self.clock = FrameClock(fps)
+        self.buffer = blank_frame(num_pixels)
+        self.name = None
+        # (effect, timeline) swapped as one, so select() is safe while running
+        self.current = None
+        self.render_time = 0.0  # seconds spent rendering and showing frames since play()
+        self.max_render_time = 0.0
+
+    def select(self, name, **options):
+        if name not in EFFECTS:
+            raise ValueError("Unknown LED effect '" + str(name) + "', expected one of " + str(list(EFFECTS.keys())))
+
+        effect = EFFECTS[name](self.num_pixels, self.clock.fps, **options)
+        timeline = effect.timeline() if effect.period else None
+        self.current = (effect, timeline)
+        self.name = name
+
+    def frame(self, index):
+        effect, timeline = self.current
+        if timeline is not None:
+            return timeline[index % len(timeline)]
+        effect.render(index, self.buffer)
+        return self.buffer
+
+    def play(self, show, stopping):
+        """Scheduler task body: pass a frame to show() each step until
+        stopping() returns True, yielding when the next frame is due.
+        """
+        clock = self.clock
+        clock.start()
+        self.render_time = 0.0
+        self.max_render_time = 0.0
+        while not stopping():
+            started = time.monotonic()
+            show(self.frame(clock.frames + clock.dropped))
+            elapsed = time.monotonic() - started
+            self.render_time += elapsed
+            self.max_render_time = max(self.max_render_time, elapsed)
+            yield clock.advance()
+
+    def stats(self):
+        stats = self.clock.stats()
+        stats['effect'] = self.name
+        frames = self.clock.frames
+        stats['avg_render_ms'] = round(self.render_time / frames * 1000, 2) if frames else None
+        stats['max_render_ms'] = round(self.max_render_time * 1000, 2)
+        return stats
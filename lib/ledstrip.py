@@ -1,6 +1,9 @@
 from logger import Logger
 import threading
 import time
+from lib import metrics
+from lib.scheduler import Scheduler
+from lib.led_effects import EffectEngine, blank_frame, brightness_tables
 from lib.neopixel import *
 
 # LED strip configuration:
@@ -8,82 +11,96 @@ LED_COUNT = 77  # Number of LED pixels.
 LED_PIN = 10  # GPIO pin connected to the pixels (10 uses SPI /dev/spidev0.0).
 LED_FREQ_HZ = 800000  # LED signal frequency in hertz (usually 800khz)
 LED_DMA = 10  # DMA channel to use for generating signal (try 10)
-LED_BRIGHTNESS = 255  # Set to 0 for darkest and 255 for brightest
+LED_BRIGHTNESS = 255  # Hardware brightness, fades are done in software with LED_GAMMA
 LED_INVERT = False  # True to invert the signal (when using NPN transistor level shift)
 LED_CHANNEL = 0  # set to '1' for GPIOs 13, 19, 41, 45 or 53
-LED_STRIP = ws.WS2811_STRIP_GRB  # Strip type and colour ordering
+LED_STRIP = WS2811_STRIP_GRB  # Strip type and colour ordering
+LED_FPS = 50  # Effect frame rate
+LED_EFFECT = 'rainbow'  # Default effect, see lib.led_effects.EFFECTS
+LED_GAMMA = 2.2  # Gamma used for brightness fades
+LED_FADE_TIME = 1.5  # Seconds to fade out after stop()
+
+SHOW_TIME = metrics.histogram('led.show')
 
 
 class LEDStrip:
-    def __init__(self):
-        self.thr = None
-        self.stopping = False
-        # Create NeoPixel object with appropriate configuration.
-        self.strip = Adafruit_NeoPixel(
-            LED_COUNT, LED_PIN, LED_FREQ_HZ,
-            LED_DMA, LED_INVERT, LED_BRIGHTNESS,
-            LED_CHANNEL, LED_STRIP)
+    def __init__(self, strip=None, scheduler=None):
+        self.scheduler = scheduler if scheduler is not None else Scheduler('led')
+        self.task = None
+        self.stopping = False  # fading out
+        self.finished = False  # faded out, the task is about to end
+        self._lock = threading.Lock()
+        # Create NeoPixel object with appropriate configuration, unless
+        # we've been handed a stand-in (see lib.simulation.FrameRecorder)
+        if strip is None:
+            strip = Adafruit_NeoPixel(
+                LED_COUNT, LED_PIN, LED_FREQ_HZ,
+                LED_DMA, LED_INVERT, LED_BRIGHTNESS,
+                LED_CHANNEL, LED_STRIP)
+        self.strip = strip
+        self.effects = EffectEngine(LED_COUNT, LED_FPS)
+        self.effects.select(LED_EFFECT)
+        # Perceived brightness, 0 - 255, applied through brightness_tables
+        # as each frame is written out
+        self.brightness = 255
+        self.brightness_tables = brightness_tables(LED_GAMMA)
+        self.fade_started = None
+        self.blank = blank_frame(LED_COUNT)
         # Intialize the library (must be called once before other functions).
         self.strip.begin()
         # Make sure the lights start in an off state
-        self.strip.setBrightness(0)
-        self.strip.show()
+        self.show_frame(self.blank)
 
-    @staticmethod
-    def wheel(pos):
-        """Generate rainbow colors across 0-255 positions."""
-        if pos < 85:
-            return Color(pos * 3, 255 - pos * 3, 0)
-        elif pos < 170:
-            pos -= 85
-            return Color(255 - pos * 3, 0, pos * 3)
-        else:
-            pos -= 170
-            return Color(0, pos * 3, 255 - pos * 3)
+    def set_effect(self, name, **options):
+        """Switch effect, see lib.led_effects.EFFECTS for names and options."""
+        self.effects.select(name, **options)
 
-    def rainbow(self, wait_ms=20, iterations=1):
-        """Draw rainbow that fades across all pixels at once."""
-        for j in range(256 * iterations):
-            for i in range(self.strip.numPixels()):
-                self.strip.setPixelColor(i, self.wheel((i + j) & 255))
-            self.strip.show()
-            time.sleep(wait_ms / 1000.0)
-            if self.stopping:
-                return
+    def show_frame(self, frame):
+        started = time.monotonic()
+        table = self.brightness_tables[self.brightness] if self.brightness < 255 else None
+        self.strip.set_pixels(frame, table)
+        self.strip.show()
+        SHOW_TIME.observe(time.monotonic() - started)
 
     def stop(self):
-        self.stopping = True
+        """Fade out and turn off."""
+        with self._lock:
+            self.stopping = True
 
     def run(self):
-        if self.thr is not None:
-            if self.thr.isAlive():
+        with self._lock:
+            # Coming back during the fade out just turns the lights back up
+            self.brightness = 255
+            self.fade_started = None
+            self.stopping = False
+            task = self.task
+            if task is not None and task.running() and not (self.finished or task.token.cancelled):
                 return
-        self.thr = LEDThread(0, 'loop', self)
-        self.strip.setBrightness(LED_BRIGHTNESS)
-        self.strip.show()
-        self.stopping = False
-        self.thr.start()
+            self.finished = False
+            self.task = self.scheduler.spawn('led', self.loop)
 
-    def loop(self):
-        while not self.stopping:
-            Logger.write.debug('LED strip rainbow!')
-            self.rainbow()
+    def faded_out(self):
+        """Checked once per frame. After stop(), ramps the brightness down
+        over LED_FADE_TIME and returns True once it reaches zero. Driven by
+        the clock, so frames dropped while fading don't stretch the fade.
+        """
+        with self._lock:
+            if not self.stopping:
+                return False
+            now = time.monotonic()
+            if self.fade_started is None:
+                self.fade_started = now
+            progress = (now - self.fade_started) / LED_FADE_TIME
+            self.brightness = max(int(round(255 * (1 - progress))), 0)
+            self.finished = self.brightness == 0
+            return self.finished
 
-        # Fade it out
-        for b in range(LED_BRIGHTNESS, 0, -3):
-            self.strip.setBrightness(b)
-            time.sleep(20 / 1000.0)
-            self.strip.show()
-        # Make sure the lights are off
-        self.strip.setBrightness(0)
-        self.strip.show()
-
-class LEDThread(threading.Thread):
-    def __init__(self, thread_id, name, led_strip):
-        threading.Thread.__init__(self)
-        self.threadID = thread_id
-        self.name = name
-        self.led_strip = led_strip
+    def loop(self, token):
+        Logger.write.debug('LED strip %s!', self.effects.name)
+        # The effect keeps running while it fades out. Cancelling the task
+        # skips the fade.
+        yield from self.effects.play(self.show_frame, lambda: token.cancelled or self.faded_out())
+        Logger.write.debug('LED effect stats: %s', self.effects.stats())
 
-    def run(self):
-        self.led_strip.loop()
+        # Make sure the lights are off
+        self.show_frame(self.blank)
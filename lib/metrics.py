@@ -0,0 +1,233 @@
+# Counters and latency histograms for the hot paths.
+#
+# Call sites grab their counter/histogram once at import time and record
+# into it directly. Until enable() (or start()) is called every record is a
+# single flag check, so instrumentation can stay in the render and sensor
+# loops. Updates aren't locked; under the GIL the worst case is the odd lost
+# count, which is fine for profiling.
+import json
+import os
+import socketserver
+import threading
+import time
+from bisect import bisect_left
+from logger import Logger
+
+# Upper bounds of the histogram buckets, in seconds. Anything slower lands
+# in a final overflow bucket.
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SNAPSHOT_INTERVAL = 10.0  # seconds between snapshot file writes
+
+enabled = False
+started = time.time()
+_counters = {}
+_histograms = {}
+_stopwatches = {}
+_lock = threading.Lock()
+
+
+class Counter:
+    def __init__(self, name):
+        self.name = name
+        self.value = 0
+
+    def inc(self, n=1):
+        if enabled:
+            self.value += n
+
+    def reset(self):
+        self.value = 0
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram:
+    """Latency histogram over fixed BUCKETS, plus count, total and max."""
+
+    def __init__(self, name):
+        self.name = name
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        if not enabled:
+            return
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def reset(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of samples, in seconds."""
+        if self.count == 0:
+            return None
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return BUCKETS[index] if index < len(BUCKETS) else self.max
+        return self.max
+
+    def snapshot(self):
+        if self.count == 0:
+            return {'count': 0}
+        buckets = {}
+        for index, count in enumerate(self.counts):
+            if count:
+                label = '<=' + ms(BUCKETS[index]) if index < len(BUCKETS) else '>' + ms(BUCKETS[-1])
+                buckets[label] = count
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total / self.count * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+            'p50_ms': round(self.percentile(0.5) * 1000, 3),
+            'p95_ms': round(self.percentile(0.95) * 1000, 3),
+            'p99_ms': round(self.percentile(0.99) * 1000, 3),
+            'buckets': buckets
+        }
+
+
+class Stopwatch:
+    """Times from start() to the first stop() after it into a histogram.
+
+    For latencies that cross threads, e.g. from an activation on the main
+    loop to the first frame drawn on the render thread.
+    """
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.started = None
+
+    def start(self):
+        if enabled:
+            self.started = time.monotonic()
+
+    def stop(self):
+        started = self.started
+        if started is not None:
+            self.started = None
+            self.histogram.observe(time.monotonic() - started)
+
+
+def ms(seconds):
+    return ('%g' % (seconds * 1000)) + 'ms'
+
+
+def counter(name):
+    with _lock:
+        if name not in _counters:
+            _counters[name] = Counter(name)
+        return _counters[name]
+
+
+def histogram(name):
+    with _lock:
+        if name not in _histograms:
+            _histograms[name] = Histogram(name)
+        return _histograms[name]
+
+
+def stopwatch(name):
+    """A Stopwatch feeding the histogram called name."""
+    with _lock:
+        if name not in _stopwatches:
+            if name not in _histograms:
+                _histograms[name] = Histogram(name)
+            _stopwatches[name] = Stopwatch(_histograms[name])
+        return _stopwatches[name]
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    with _lock:
+        for metric in list(_counters.values()) + list(_histograms.values()):
+            metric.reset()
+
+
+def snapshot():
+    with _lock:
+        return {
+            'time': time.time(),
+            'uptime': round(time.time() - started, 1),
+            'enabled': enabled,
+            'counters': {name: c.snapshot() for name, c in sorted(_counters.items())},
+            'histograms': {name: h.snapshot() for name, h in sorted(_histograms.items())}
+        }
+
+
+def write_snapshot(path):
+    """Write snapshot() to path as JSON, atomically so readers never see half a file."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot(), f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def start(snapshot_path=None, socket_path=None, interval=SNAPSHOT_INTERVAL):
+    """Enable recording, and publish snapshots every interval seconds to
+    snapshot_path and/or to anyone connecting to the Unix socket at
+    socket_path (e.g. socat - UNIX-CONNECT:<path>).
+    """
+    enable()
+    if snapshot_path is not None:
+        SnapshotThread(0, 'metrics', snapshot_path, interval).start()
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = socketserver.ThreadingUnixStreamServer(socket_path, SnapshotHandler)
+        server.daemon_threads = True
+        SocketThread(0, 'metrics_socket', server).start()
+
+
+class SnapshotHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.wfile.write(json.dumps(snapshot()).encode() + b'\n')
+
+
+class SnapshotThread(threading.Thread):
+    def __init__(self, thread_id, name, path, interval):
+        threading.Thread.__init__(self, daemon=True)
+        self.threadID = thread_id
+        self.name = name
+        self.path = path
+        self.interval = interval
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                write_snapshot(self.path)
+            except OSError as err:
+                Logger.write.warning('Could not write metrics snapshot: ' + str(err))
+
+
+class SocketThread(threading.Thread):
+    def __init__(self, thread_id, name, server):
+        threading.Thread.__init__(self, daemon=True)
+        self.threadID = thread_id
+        self.name = name
+        self.server = server
+
+    def run(self):
+        self.server.serve_forever()
@@ -1,10 +1,12 @@
-import json
 import os
 import threading
 import time
 from random import *
 import pygame
 from lib.fading_text import FadingText
+from lib.phrase_deck import PhraseDeck
+from lib.render_cache import RenderCache
+from lib.scheduler import Scheduler
 from logger import Logger
 
 # Set up some constants
@@ -13,20 +15,34 @@ FADE_OUT_TIME = 2
 
 
 class MirrorText:
-    def __init__(self, basepath, screen):
+    def __init__(self, basepath, display, scheduler=None):
         Logger.write.info("MirrorText: init()")
         self.basepath = basepath
-        self.screen = screen
+        self.display = display
         self.fontlib = []
         self.fontsize = 72
         self.phrases = None
-        self.thr = None
-        self.stopping = False
-
-        self.load_fonts(
-            os.path.join(self.basepath, "data", "fonts"), ['.otf', '.ttf'])
-
-        Logger.write.info("MirrorText ready!")
+        self.next_text = None  # first phrase of the next activation, laid out by prepare()
+        self.deck = PhraseDeck(os.path.join(self.basepath, 'cache/phrases.json'))
+        # Shared across phrase changes so each line is only rasterized once
+        self.render_cache = RenderCache()
+        self.scheduler = scheduler if scheduler is not None else Scheduler('mirror')
+        self.task = None
+        # Fonts and phrase layout are loaded by load(), as a stage of startup
+        # or else on the first prepare()
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        """Load the fonts, and the phrases if they changed. Safe to call from any thread."""
+        with self._load_lock:
+            if len(self.fontlib) == 0:
+                self.load_fonts(
+                    os.path.join(self.basepath, "data", "fonts"), ['.otf', '.ttf'])
+                Logger.write.info("MirrorText ready!")
+
+            # Only touches the disk if phrases.json changed since we last looked
+            if self.deck.refresh():
+                self.prelayout()
 
     def load_fonts(self, fontdir, font_exts):
         for file in os.listdir(fontdir):
@@ -36,59 +52,80 @@ class MirrorText:
 
         Logger.write.info("loaded " + str(len(self.fontlib)) + " fonts")
 
-    def run(self):
-        if self.thr is not None:
-            if self.thr.isAlive():
-                return
-        self.stopping = False
+    # Wrap every phrase in every font up front so that starting a phrase
+    # never has to lay out text
+    def prelayout(self):
+        box = FadingText.wrap_box(self.display.screen.get_size())
+        for phrase in self.deck.phrases:
+            for font in self.fontlib:
+                self.render_cache.layout(font, phrase['text'], box, FadingText.wrap)
 
-        with open(os.path.join(self.basepath, 'cache/phrases.json')) as phrase_file:
-            self.phrases = json.load(phrase_file)['phrases']
-        Logger.write.info("Loaded " + str(len(self.phrases)) + " phrases")
+    # Showing phrases, as opposed to fading out after stop()
+    def active(self):
+        return self.task is not None and self.task.running() and not self.task.token.cancelled
 
-        # Randomize the sequence - but don't choose a random phrase from the list each time
-        # otherwise, you risk duplicate consecutive phrases
-        shuffle(self.phrases)
-
-        self.thr = MirrorThread(0, 'loop', self)
-        self.thr.start()
+    def run(self):
+        if self.active():
+            return
+
+        if self.next_text is None:
+            self.prepare()
+        if self.next_text is None:
+            Logger.write.error("No phrases to show")
+            return
+
+        # The task takes the prepared phrases with it, so a later prepare()
+        # can't swap them out from under it. If the last activation is
+        # still fading out, the new one starts once it's done.
+        text = self.next_text
+        self.next_text = None
+        self.task = self.scheduler.spawn('mirror', self.loop, self.task, self.phrases, text)
+
+    def prepare(self):
+        """Deal the phrases and lay out the first one ahead of run()."""
+        if self.active():
+            return
+
+        self.load()
+        self.phrases = self.deck.deal()
+        self.next_text = None
+        if len(self.phrases) > 0:
+            self.next_text = FadingText(self.display, self.fontlib, self.phrases[0]['text'],
+                                        render_cache=self.render_cache)
+
+    def loop(self, token, previous, phrases, fading_text):
+        if previous is not None:
+            yield previous
 
-    def loop(self):
         phrase_index = 0
-        last_change = 0
-        phrase = self.phrases[phrase_index]
-        fading_text = FadingText(self.screen, self.fontlib, phrase['text'])
-        while True:
-
-            if self.stopping:
-                Logger.write.debug('MirrorText stopping')
-                fading_text.stop()
-                fading_text.fade(FadingText.ST_FADEOUT, 1)
-                Logger.write.debug('MirrorText stopped')
-                return
-
-            if time.time() > phrase['duration'] + last_change:
-                fading_text.fade(FadingText.ST_FADEOUT, FADE_OUT_TIME)
-                # Next
-                phrase_index += 1
-                if phrase_index >= len(self.phrases):
-                    phrase_index = 0
-
-                phrase = self.phrases[phrase_index]
-                fading_text = FadingText(self.screen, self.fontlib, phrase['text'])
-                last_change = time.time()
-                fading_text.fade(FadingText.ST_FADEIN, FADE_IN_TIME)
+        phrase = phrases[phrase_index]
+        last_change = time.time()
+        yield from fading_text.fade_in(FADE_IN_TIME, token)
+        while not token.cancelled:
+            # Show the phrase until it's time for the next one, or we're stopped
+            remaining = phrase['duration'] + last_change - time.time()
+            if remaining > 0:
+                yield time.monotonic() + remaining
+                continue
+
+            yield from fading_text.fade_out(FADE_OUT_TIME, token)
+            if token.cancelled:
+                break
+            # Next
+            phrase_index += 1
+            if phrase_index >= len(phrases):
+                phrase_index = 0
+                Logger.write.debug('Render cache: %s', self.render_cache.stats())
+
+            phrase = phrases[phrase_index]
+            fading_text = FadingText(self.display, self.fontlib, phrase['text'], render_cache=self.render_cache)
+            last_change = time.time()
+            yield from fading_text.fade_in(FADE_IN_TIME, token)
+
+        Logger.write.debug('MirrorText stopping')
+        yield from fading_text.fade_out(1)
+        Logger.write.debug('MirrorText stopped')
 
     def stop(self):
-        self.stopping = True
-
-
-class MirrorThread(threading.Thread):
-    def __init__(self, thread_id, name, mirror):
-        threading.Thread.__init__(self)
-        self.threadID = thread_id
-        self.name = name
-        self.mirror = mirror
-
-    def run(self):
-        self.mirror.loop()
\ No newline at end of file
+        if self.task is not None:
+            self.task.cancel()
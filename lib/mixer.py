@@ -0,0 +1,186 @@
+import threading
+import time
+import pygame
+from logger import Logger
+
+MIXER_BUFFER = 512  # samples; smaller means less delay before the first sample is heard
+FADE_STEP = 0.02  # seconds between volume changes while fading
+
+
+class Mixer:
+    """Owns the pygame mixer device.
+
+    Reopening the ALSA device is slow and can click, so the mixer is only
+    torn down and reinitialized when a track needs a different sample rate
+    or channel count than the one currently open.
+
+    Volume fades run on the mixer's own thread so callers never block on
+    them. A fade can be replaced at any time, which is how a fade out is
+    cancelled when someone comes back before the music has stopped.
+    """
+
+    def __init__(self):
+        self.format = None  # (frequency, channels) the device is open with
+        self.cued = None  # file already loaded and waiting to play
+        self.reinits = 0
+        self.volume = 1.0
+        self.on_stopped = None  # called from the mixer thread once a fade out has stopped the music
+        self._fade = None
+        self._condition = threading.Condition()
+        self.thr = MixerThread(0, 'fade', self)
+        self.thr.start()
+
+    @staticmethod
+    def mp3_format(metadata):
+        # The mixer does not understand on its own how to play files at 48000Hz, etc.
+        frequency = int(metadata.sample_rate / metadata.channels)
+        return frequency, metadata.channels
+
+    def open(self, track_format):
+        """Make sure the device is open in track_format, a (frequency, channels) pair."""
+        if track_format == self.format and pygame.mixer.get_init():
+            return False
+
+        frequency, channels = track_format
+        pygame.mixer.quit()
+        pygame.mixer.pre_init(frequency=frequency, channels=channels, buffer=MIXER_BUFFER)
+        pygame.mixer.init()
+        self.format = track_format
+        self.cued = None
+        self.reinits += 1
+        Logger.write.info('Mixer reopened at ' + str(frequency) + 'Hz, ' + str(channels) + ' channel(s)')
+        return True
+
+    def cue(self, filename, track_format):
+        """Open the device and load filename ahead of time so play() can start at once.
+
+        Does nothing while music is playing, since loading would cut it off.
+        """
+        if self.busy():
+            return False
+
+        self.open(track_format)
+        pygame.mixer.music.load(filename)
+        self.cued = filename
+        return True
+
+    def play(self, filename, track_format, loops=-1):
+        """Start playing filename and log how long it took to get going."""
+        started = time.monotonic()
+        self.cancel_fade()
+        reopened = self.open(track_format)
+        was_cued = self.cued == filename
+        if not was_cued:
+            pygame.mixer.music.load(filename)
+        pygame.mixer.music.set_volume(1.0)
+        self.volume = 1.0
+        pygame.mixer.music.play(loops)
+        self.cued = None
+        elapsed = time.monotonic() - started
+
+        # Samples only reach the speaker once the first buffer drains
+        buffer_latency = 0.0
+        init = pygame.mixer.get_init()
+        if init is not None:
+            buffer_latency = MIXER_BUFFER / init[0]
+
+        Logger.write.info('Audio start took ' + str(round(elapsed * 1000)) + 'ms' +
+                          (' (cued)' if was_cued else '') +
+                          (' (mixer reopened)' if reopened else '') +
+                          ', ~' + str(round(buffer_latency * 1000)) + 'ms to first sample')
+
+    @staticmethod
+    def busy():
+        return bool(pygame.mixer.get_init()) and pygame.mixer.music.get_busy()
+
+    @staticmethod
+    def position():
+        """Seconds since the music started playing, counting across loops."""
+        if not pygame.mixer.get_init():
+            return 0.0
+        return max(pygame.mixer.music.get_pos(), 0) / 1000
+
+    @staticmethod
+    def set_music_volume(volume):
+        if pygame.mixer.get_init():
+            pygame.mixer.music.set_volume(volume)
+
+    @staticmethod
+    def stop_music():
+        if pygame.mixer.get_init():
+            pygame.mixer.music.stop()
+
+    def fade_to(self, volume, duration, delay=0.0, stop=False):
+        """Ramp the music volume to volume over duration seconds, starting after delay.
+
+        With stop set the music is stopped once the fade completes. Replaces
+        any fade already in progress and returns immediately.
+        """
+        with self._condition:
+            self._fade = {
+                'start': time.monotonic() + delay,
+                'from': self.volume,
+                'to': volume,
+                'duration': duration,
+                'stop': stop
+            }
+            self._condition.notify()
+
+    def fade_out(self, duration, delay=0.0):
+        self.fade_to(0.0, duration, delay, stop=True)
+
+    def resume(self, duration=0.5):
+        """Cancel a fade out and bring the volume back up."""
+        self.fade_to(1.0, duration)
+
+    def cancel_fade(self):
+        with self._condition:
+            self._fade = None
+
+    def fading_out(self):
+        fade = self._fade
+        return fade is not None and fade['stop']
+
+    def fade_loop(self):
+        while True:
+            stopped = False
+
+            with self._condition:
+                while self._fade is None:
+                    self._condition.wait()
+
+                fade = self._fade
+                now = time.monotonic()
+                if now < fade['start']:
+                    self._condition.wait(fade['start'] - now)
+                    continue
+
+                progress = 1.0
+                if fade['duration'] > 0:
+                    progress = min((now - fade['start']) / fade['duration'], 1.0)
+                self.volume = fade['from'] + (fade['to'] - fade['from']) * progress
+
+                self.set_music_volume(self.volume)
+
+                if progress >= 1.0:
+                    self._fade = None
+                    if fade['stop']:
+                        self.stop_music()
+                        stopped = True
+                else:
+                    self._condition.wait(FADE_STEP)
+
+            # Outside the lock, the callback is free to start new fades
+            if stopped and self.on_stopped is not None:
+                self.on_stopped()
+
+
+class MixerThread(threading.Thread):
+    def __init__(self, thread_id, name, mixer):
+        threading.Thread.__init__(self, daemon=True)
+        self.threadID = thread_id
+        self.name = name
+        self.mixer = mixer
+
+    def run(self):
+        self.mixer.fade_loop()
@@ -1,8 +1,28 @@
 # Adafruit NeoPixel library port to the rpi_ws281x library.
 # Author: Tony DiCola (tony@tonydicola.com), Jeremy Garff (jer@jers.net)
 import atexit
+import ctypes
+from array import array
 
-import _rpi_ws281x as ws
+# _rpi_ws281x is imported when the first strip is created, so this module
+# can be imported off a Pi (e.g. for simulation)
+ws = None
+
+# Strip types, from ws2811.h
+WS2811_STRIP_RGB = 0x00100800
+WS2811_STRIP_RBG = 0x00100008
+WS2811_STRIP_GRB = 0x00081000
+WS2811_STRIP_GBR = 0x00080010
+WS2811_STRIP_BRG = 0x00001008
+WS2811_STRIP_BGR = 0x00000810
+
+
+def _load_ws():
+	global ws
+	if ws is None:
+		import _rpi_ws281x
+		ws = _rpi_ws281x
+	return ws
 
 
 def Color(red, green, blue, white = 0):
@@ -28,7 +48,7 @@ class _LED_Data(object):
 		# Handle if a slice of positions are passed in by grabbing all the values
 		# and returning them in a list.
 		if isinstance(pos, slice):
-			return [ws.ws2811_led_get(self.channel, n) for n in xrange(*pos.indices(self.size))]
+			return [ws.ws2811_led_get(self.channel, n) for n in range(*pos.indices(self.size))]
 		# Else assume the passed in value is a number to the position.
 		else:
 			return ws.ws2811_led_get(self.channel, pos)
@@ -41,7 +61,7 @@ class _LED_Data(object):
 		# LED data values to the provided values.
 		if isinstance(pos, slice):
 			index = 0
-			for n in xrange(*pos.indices(self.size)):
+			for n in range(*pos.indices(self.size)):
 				ws.ws2811_led_set(self.channel, n, value[index])
 				index += 1
 		# Else assume the passed in value is a number to the position.
@@ -51,7 +71,7 @@ class _LED_Data(object):
 
 class Adafruit_NeoPixel(object):
 	def __init__(self, num, pin, freq_hz=800000, dma=5, invert=False,
-			brightness=255, channel=0, strip_type=ws.WS2811_STRIP_RGB):
+			brightness=255, channel=0, strip_type=WS2811_STRIP_RGB):
 		"""Class to represent a NeoPixel/WS281x LED display.  Num should be the
 		number of pixels in the display, and pin should be the GPIO pin connected
 		to the display signal line (must be a PWM pin like 18!).  Optional
@@ -60,6 +80,8 @@ class Adafruit_NeoPixel(object):
 		specifying if the signal line should be inverted (default False), and
 		channel, the PWM channel to use (defaults to 0).
 		"""
+		_load_ws()
+
 		# Create ws2811_t structure and fill in parameters.
 		self._leds = ws.new_ws2811_t()
 
@@ -85,6 +107,8 @@ class Adafruit_NeoPixel(object):
 
 		# Grab the led data array.
 		self._led_data = _LED_Data(self._channel, num)
+		# Address of the C LED color array, set once begin() has allocated it
+		self._leds_address = None
 
 		# Substitute for __del__, traps an exit condition and cleans up properly
 		atexit.register(self._cleanup)
@@ -104,6 +128,17 @@ class Adafruit_NeoPixel(object):
 		if resp != ws.WS2811_SUCCESS:
 			message = ws.ws2811_get_return_t_str(resp)
 			raise RuntimeError('ws2811_init failed with code {0} ({1})'.format(resp, message))
+		self._leds_address = self._led_buffer_address()
+
+	def _led_buffer_address(self):
+		"""Return the address of the channel's uint32 LED color array, or None
+		if the SWIG binding won't give it up.
+		"""
+		try:
+			address = int(ws.ws2811_channel_t_leds_get(self._channel))
+		except (AttributeError, TypeError, ValueError):
+			return None
+		return address if address != 0 else None
 
 	def show(self):
 		"""Update the display with the data from the LED buffer."""
@@ -136,6 +171,44 @@ class Adafruit_NeoPixel(object):
 		"""
 		return ws.ws2811_channel_t_brightness_get(self._channel)
 
+	def set_pixels(self, buffer, table=None):
+		"""Replace every LED color at once from a buffer protocol object (e.g.
+		array('I'), bytes or memoryview) holding numPixels() native 32-bit
+		color values. The whole frame is copied into the LED buffer with a
+		single memmove.
+
+		If table is given (a 256 byte bytes.translate table), every color
+		channel is mapped through it on the way, e.g. to apply brightness.
+		"""
+		view = memoryview(buffer).cast('B')
+		size = self._led_data.size * 4
+		if view.nbytes != size:
+			raise ValueError('Expected {0} bytes of pixel data, got {1}'.format(size, view.nbytes))
+		if table is not None:
+			view = memoryview(view.tobytes().translate(table))
+
+		if self._leds_address is None:
+			# No direct access to the C array, fall back to one call per pixel
+			for n, color in enumerate(view.cast('I')):
+				ws.ws2811_led_set(self._channel, n, color)
+			return
+
+		if view.readonly:
+			source = view.tobytes()
+		else:
+			source = (ctypes.c_char * size).from_buffer(view)
+		ctypes.memmove(self._leds_address, source, size)
+
+	def get_pixels(self):
+		"""Return a copy of every LED color as an array('I')."""
+		num = self._led_data.size
+		if self._leds_address is None:
+			return array('I', [ws.ws2811_led_get(self._channel, n) for n in range(num)])
+
+		pixels = array('I', bytes(num * 4))
+		ctypes.memmove(pixels.buffer_info()[0], self._leds_address, num * 4)
+		return pixels
+
 	def getPixels(self):
 		"""Return an object which allows access to the LED display data as if
 		it were a sequence of 24-bit RGB values.
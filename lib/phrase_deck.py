@@ -0,0 +1,80 @@
+import json
+import os
+from random import *
+from logger import Logger
+
+
+class PhraseDeck:
+    """The phrases from phrases.json, parsed and validated once.
+
+    The file is only re-read when its mtime or size changes, so dealing a
+    deck on activation normally costs a single stat() call.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.phrases = []
+        self._signature = None
+
+    def __len__(self):
+        return len(self.phrases)
+
+    def refresh(self):
+        """Reload the file if it has changed. Returns True if the deck changed."""
+        try:
+            stat = os.stat(self.path)
+        except OSError as err:
+            Logger.write.error('Unable to stat ' + self.path + ': ' + str(err))
+            return False
+
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return False
+
+        try:
+            with open(self.path) as phrase_file:
+                data = json.load(phrase_file)
+        except (OSError, ValueError) as err:
+            # Keep whatever we had so a bad edit doesn't blank the mirror
+            Logger.write.error('Unable to load ' + self.path + ', keeping ' + str(len(self.phrases)) +
+                               ' phrases: ' + str(err))
+            return False
+
+        self._signature = signature
+        self.phrases = self.validate(data)
+        Logger.write.info("Loaded " + str(len(self.phrases)) + " phrases")
+        return True
+
+    def deal(self):
+        """Return the phrases in a fresh random order."""
+        # Randomize the sequence - but don't choose a random phrase from the list each time
+        # otherwise, you risk duplicate consecutive phrases
+        deck = list(self.phrases)
+        shuffle(deck)
+        return deck
+
+    @staticmethod
+    def validate(data):
+        """Return the well formed phrases from parsed phrases.json data."""
+        if not isinstance(data, dict) or not isinstance(data.get('phrases'), list):
+            Logger.write.error("Phrase file has no 'phrases' list")
+            return []
+
+        phrases = []
+        for index, phrase in enumerate(data['phrases']):
+            if not isinstance(phrase, dict):
+                Logger.write.warning('Skipping phrase ' + str(index) + ': not an object')
+                continue
+
+            text = phrase.get('text')
+            duration = phrase.get('duration')
+            if not isinstance(text, str) or len(text.strip()) == 0:
+                Logger.write.warning('Skipping phrase ' + str(index) + ': missing text')
+                continue
+            if isinstance(duration, bool) or not isinstance(duration, (int, float)) or duration <= 0:
+                Logger.write.warning('Skipping phrase ' + str(index) + ': invalid duration ' + repr(duration))
+                continue
+
+            phrases.append({'text': text, 'duration': duration})
+
+        return phrases
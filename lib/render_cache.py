@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024  # Rendered surfaces are big, keep the cache bounded
+
+
+class RenderCache:
+    """LRU cache of rendered text line surfaces and wrap layouts.
+
+    The phrase deck is small and cycles forever, so the same lines get
+    rendered with the same fonts over and over. Entries are keyed by font,
+    text and (for layouts) the wrap box, and evicted least recently used
+    first once the estimated memory footprint passes max_bytes.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (value, size in bytes)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        # Never cache something that would evict everything else
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+
+            self._entries[key] = (value, size)
+            self.bytes += size
+
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def render_line(self, font, text, color):
+        """Return font.render(text, True, color), rendering only on a miss."""
+        key = ('line', font, text, tuple(color))
+        surface = self.get(key)
+        if surface is None:
+            surface = font.render(text, True, color)
+            width, height = surface.get_size()
+            self.put(key, surface, width * height * surface.get_bytesize())
+        return surface
+
+    def layout(self, font, text, box, wrap):
+        """Return the wrapped lines for text in a (width, height) box.
+
+        wrap(font, text, box) is only called on a miss.
+        """
+        key = ('layout', font, text, box)
+        lines = self.get(key)
+        if lines is None:
+            lines = tuple(wrap(font, text, box))
+            self.put(key, lines, sum(len(line) for line in lines) + 64 * len(lines))
+        return lines
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses
+        }
@@ -0,0 +1,222 @@
+import threading
+import time
+from logger import Logger
+
+STOP_TIMEOUT = 2.0  # seconds stop() waits for tasks to finish before closing them
+
+
+class CancelToken:
+    """Set once a task has been asked to stop. Tasks check it at their own safe points."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        self._event.set()
+
+
+class Task:
+    """A generator running on a Scheduler, with its cancel token and timing stats."""
+
+    def __init__(self, scheduler, name, token):
+        self.scheduler = scheduler
+        self.name = name
+        self.token = token
+        self.generator = None
+        self.wake_at = time.monotonic()  # deadline for the next step
+        self.waiting_on = None  # task this one is parked behind
+        self.waiters = []
+        self.error = None
+        self.steps = 0
+        self.busy_time = 0.0  # seconds spent inside the generator
+        self.late_total = 0.0  # seconds steps started after their deadline, summed
+        self.late_max = 0.0
+        self._done = threading.Event()
+
+    def cancel(self):
+        """Ask the task to stop. It's woken straight away to notice."""
+        self.token.cancel()
+        self.scheduler.wake(self)
+
+    def running(self):
+        return not self._done.is_set()
+
+    def join(self, timeout=None):
+        """Wait for the task to finish. Returns False if it was still running after timeout seconds."""
+        return self._done.wait(timeout)
+
+    def stats(self):
+        return {
+            'steps': self.steps,
+            'busy_ms': round(self.busy_time * 1000, 1),
+            'avg_late_ms': round(self.late_total / self.steps * 1000, 2) if self.steps else None,
+            'max_late_ms': round(self.late_max * 1000, 2)
+        }
+
+
+class Scheduler:
+    """Runs cooperative tasks on a single thread, each resumed at its own deadline.
+
+    A task is a generator function taking a CancelToken. Each time it yields
+    it hands the thread back and says when it wants to run again:
+
+    - a time.monotonic() deadline,
+    - None to run again once any other due tasks have had a turn,
+    - another Task on this scheduler to wait until that one finishes.
+
+    Nothing is preempted, so a step should do one frame's or one sample's
+    worth of work. Lateness against each deadline is tracked per task, so
+    a step that overruns shows up in stats() as lateness in the others.
+    """
+
+    def __init__(self, name='scheduler'):
+        self.name = name
+        self.tasks = []
+        self.finished = {}  # stats of finished tasks, by name
+        self._stopping = False
+        self._condition = threading.Condition()
+        self.thr = SchedulerThread(0, name, self)
+        self.thr.start()
+
+    def spawn(self, name, function, *args):
+        """Start function(token, *args) as a task and return the Task."""
+        token = CancelToken()
+        task = Task(self, name, token)
+        task.generator = function(token, *args)
+        with self._condition:
+            if self._stopping:
+                raise RuntimeError('Scheduler ' + self.name + ' has been stopped')
+            self.tasks.append(task)
+            self._condition.notify()
+        return task
+
+    def wake(self, task):
+        """Run task as soon as possible instead of waiting for its deadline."""
+        with self._condition:
+            if task.running() and task.waiting_on is None:
+                task.wake_at = time.monotonic()
+                self._condition.notify()
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """Give the tasks up to timeout seconds to finish, then close any
+        that haven't (running their finally blocks) and stop the thread.
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            tasks = list(self.tasks)
+        for task in tasks:
+            if not task.join(max(deadline - time.monotonic(), 0)):
+                Logger.write.warning('Task ' + task.name + ' did not finish in time, closing it')
+
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if threading.current_thread() is not self.thr:
+            self.thr.join()
+
+    def stats(self):
+        """Timing stats for every task that has run, live ones included, by name."""
+        with self._condition:
+            stats = {name: dict(totals) for name, totals in self.finished.items()}
+            for task in self.tasks:
+                stats[task.name + ' (running)'] = task.stats()
+        return stats
+
+    def loop(self):
+        while True:
+            with self._condition:
+                task = None
+                while task is None:
+                    if self._stopping:
+                        self._close_all()
+                        return
+                    ready = [t for t in self.tasks if t.waiting_on is None]
+                    if len(ready) == 0:
+                        self._condition.wait()
+                        continue
+                    task = min(ready, key=lambda t: t.wake_at)
+                    wait = task.wake_at - time.monotonic()
+                    if wait > 0:
+                        self._condition.wait(wait)
+                        task = None
+
+            self._step(task)
+
+    def _step(self, task):
+        started = time.monotonic()
+        late = started - task.wake_at
+        if late > 0:
+            task.late_total += late
+            task.late_max = max(task.late_max, late)
+        was_cancelled = task.token.cancelled
+
+        finished = False
+        result = None
+        try:
+            result = next(task.generator)
+        except StopIteration:
+            finished = True
+        except Exception as err:
+            Logger.write.exception('Task ' + task.name + ' failed')
+            task.error = err
+            finished = True
+
+        now = time.monotonic()
+        task.steps += 1
+        task.busy_time += now - started
+
+        with self._condition:
+            if finished:
+                self._finish(task)
+                return
+            if isinstance(result, Task):
+                if result.running() and result.scheduler is self:
+                    task.waiting_on = result
+                    result.waiters.append(task)
+                task.wake_at = now
+            else:
+                task.wake_at = result if result is not None else now
+            # Cancelled mid-step, make sure it gets to see that promptly
+            if task.token.cancelled and not was_cancelled:
+                task.wake_at = now
+
+    # Called with the condition held
+    def _finish(self, task):
+        self.tasks.remove(task)
+        totals = self.finished.setdefault(task.name, {'runs': 0, 'steps': 0, 'busy_ms': 0.0, 'max_late_ms': 0.0})
+        stats = task.stats()
+        totals['runs'] += 1
+        totals['steps'] += stats['steps']
+        totals['busy_ms'] = round(totals['busy_ms'] + stats['busy_ms'], 1)
+        totals['max_late_ms'] = max(totals['max_late_ms'], stats['max_late_ms'])
+        task._done.set()
+
+        now = time.monotonic()
+        for waiter in task.waiters:
+            waiter.waiting_on = None
+            waiter.wake_at = now
+        task.waiters = []
+
+    # Called with the condition held
+    def _close_all(self):
+        for task in list(self.tasks):
+            try:
+                task.generator.close()
+            except Exception:
+                Logger.write.exception('Task ' + task.name + ' failed while closing')
+            self._finish(task)
+
+
+class SchedulerThread(threading.Thread):
+    def __init__(self, thread_id, name, scheduler):
+        threading.Thread.__init__(self, daemon=True)
+        self.threadID = thread_id
+        self.name = name
+        self.scheduler = scheduler
+
+    def run(self):
+        self.scheduler.loop()
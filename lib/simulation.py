@@ -0,0 +1,292 @@
+# Stand-ins for the mirror's hardware, so the whole activation path can run
+# (and be profiled) on a machine without the distance sensor, LED strip,
+# audio device, display or GPIO header. See benchmarks/activation_benchmark.py
+# and MIRROR_HEADLESS in mirror.py.
+import os
+import random
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from lib.audio_library import AudioInfo, AudioLibrary
+from lib.mixer import Mixer
+
+# Timing budgets (us) the VL53L0X reports for each ranging mode, plus the
+# 1ms VL53L0X.get_timing() adds
+MODE_TIMING = {
+    0: 34000,  # good
+    1: 67000,  # better
+    2: 201000,  # best
+    3: 34000,  # long range
+    4: 21000  # high speed
+}
+
+
+def use_headless_display():
+    """Point SDL at its dummy video and audio drivers. Call before pygame.init()."""
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
+
+class DistanceTrace:
+    """A scripted distance over time.
+
+    points is a list of (seconds, mm) pairs; the distance is interpolated
+    linearly between them and holds at the last point. Time starts counting
+    when start() is called, until then the trace sits at its first point.
+    """
+
+    def __init__(self, points):
+        self.points = sorted(points)
+        self.times = [t for t, _ in self.points]
+        self.started = None
+
+    def start(self, now=None):
+        self.started = time.monotonic() if now is None else now
+
+    def duration(self):
+        return self.times[-1]
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return time.monotonic() - self.started
+
+    def distance_at(self, t):
+        index = bisect_right(self.times, t)
+        if index == 0:
+            return self.points[0][1]
+        if index == len(self.points):
+            return self.points[-1][1]
+        t0, d0 = self.points[index - 1]
+        t1, d1 = self.points[index]
+        return d0 + (d1 - d0) * (t - t0) / (t1 - t0)
+
+    def crossings(self, enter_threshold, exit_threshold=None):
+        """Times at which the trace itself enters and leaves, as (seconds, entered) pairs.
+
+        This is the ground truth the activation latency is measured against.
+        """
+        if exit_threshold is None:
+            exit_threshold = enter_threshold
+        crossings = []
+        present = self.points[0][1] < enter_threshold
+        for (t0, d0), (t1, d1) in zip(self.points, self.points[1:]):
+            threshold = exit_threshold if present else enter_threshold
+            crossed = d1 > threshold if present else d1 < threshold
+            if crossed:
+                t = t0 + (t1 - t0) * (threshold - d0) / (d1 - d0)
+                present = not present
+                crossings.append((t, present))
+        return crossings
+
+
+class FakeToF:
+    """Stands in for lib.VL53L0X.VL53L0X, reading distances off a DistanceTrace."""
+
+    def __init__(self, trace, noise=0.0):
+        self.trace = trace
+        self.noise = noise  # standard deviation of the measurement noise, mm
+        self.mode = None
+        self.reads = 0
+
+    def start_ranging(self, mode=0):
+        self.mode = mode
+
+    def stop_ranging(self):
+        self.mode = None
+
+    def get_distance(self):
+        self.reads += 1
+        distance = self.trace.distance_at(self.trace.elapsed())
+        if self.noise:
+            distance += random.gauss(0, self.noise)
+        return max(int(distance), 1)
+
+    def get_timing(self):
+        return MODE_TIMING.get(self.mode, 0)
+
+
+class FrameRecorder:
+    """Stands in for lib.neopixel.Adafruit_NeoPixel, keeping frames in memory.
+
+    Counts show() calls and notes each time the strip goes from dark to lit,
+    which is when someone would see it come on. The last keep frames shown
+    are kept in frames.
+    """
+
+    def __init__(self, num, keep=0):
+        self.num = num
+        self.brightness = 255
+        self.pixels = array('I', bytes(4 * num))
+        self.shows = 0
+        self.lit = False
+        self.lit_times = []  # time.monotonic() of each dark to lit show()
+        self.keep = keep
+        self.frames = []
+
+    def begin(self):
+        pass
+
+    def set_pixels(self, buffer, table=None):
+        view = memoryview(buffer).cast('B')
+        if view.nbytes != self.num * 4:
+            raise ValueError('Expected {0} bytes of pixel data, got {1}'.format(self.num * 4, view.nbytes))
+        if table is not None:
+            view = memoryview(view.tobytes().translate(table))
+        memoryview(self.pixels).cast('B')[:] = view
+
+    def get_pixels(self):
+        return array('I', self.pixels)
+
+    def show(self):
+        self.shows += 1
+        lit = self.brightness > 0 and any(self.pixels)
+        if lit and not self.lit:
+            self.lit_times.append(time.monotonic())
+        self.lit = lit
+        if self.keep:
+            self.frames.append(array('I', self.pixels))
+            del self.frames[:-self.keep]
+
+    def setPixelColor(self, n, color):
+        self.pixels[n] = color
+
+    def setBrightness(self, brightness):
+        self.brightness = brightness
+
+    def getBrightness(self):
+        return self.brightness
+
+    def numPixels(self):
+        return self.num
+
+
+class NullMixer(Mixer):
+    """A Mixer that never opens an audio device.
+
+    Volume fades run as usual on the mixer thread. Tracks are "playing"
+    from play() until a fade out stops them, and every play() is logged in
+    plays as (time.monotonic(), filename).
+    """
+
+    def __init__(self):
+        self.playing = None
+        self.plays = []
+        self.started = None
+        Mixer.__init__(self)
+
+    def open(self, track_format):
+        if track_format == self.format:
+            return False
+        self.format = track_format
+        self.cued = None
+        self.reinits += 1
+        return True
+
+    def cue(self, filename, track_format):
+        if self.busy():
+            return False
+        self.open(track_format)
+        self.cued = filename
+        return True
+
+    def play(self, filename, track_format, loops=-1):
+        self.cancel_fade()
+        self.open(track_format)
+        self.volume = 1.0
+        self.cued = None
+        self.playing = filename
+        self.started = time.monotonic()
+        self.plays.append((self.started, filename))
+
+    def busy(self):
+        return self.playing is not None
+
+    def position(self):
+        if self.playing is None:
+            return 0.0
+        return time.monotonic() - self.started
+
+    def set_music_volume(self, volume):
+        pass
+
+    def stop_music(self):
+        self.playing = None
+
+
+class FakeLibrary(AudioLibrary):
+    """An AudioLibrary with a fixed set of tracks and no directory behind it."""
+
+    def __init__(self, tracks=None):
+        self.audio_dir = None
+        self.index_path = None
+        self.thr = None
+        if tracks is None:
+            tracks = {'simulated.mp3': AudioInfo(44100, 2, 180.0)}
+        self.tracks = tracks
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        return False
+
+    def refresh_async(self):
+        pass
+
+
+class FakeGPIO:
+    """Stands in for the RPi.GPIO module.
+
+    Outputs are remembered in outputs; inputs read their pull resistor's
+    level until set_input() drives them, which also fires any callbacks
+    registered with add_event_detect().
+    """
+    BCM = 11
+    BOARD = 10
+    IN = 1
+    OUT = 0
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self):
+        self.mode = None
+        self.inputs = {}
+        self.outputs = {}
+        self.callbacks = {}
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setup(self, pin, direction, pull_up_down=PUD_OFF, initial=LOW):
+        if direction == FakeGPIO.IN:
+            self.inputs[pin] = FakeGPIO.HIGH if pull_up_down == FakeGPIO.PUD_UP else FakeGPIO.LOW
+        else:
+            self.outputs[pin] = initial
+
+    def input(self, pin):
+        return self.inputs.get(pin, FakeGPIO.LOW)
+
+    def output(self, pin, value):
+        self.outputs[pin] = value
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        self.callbacks[pin] = (edge, callback)
+
+    def set_input(self, pin, value):
+        previous = self.inputs.get(pin)
+        self.inputs[pin] = value
+        edge, callback = self.callbacks.get(pin, (None, None))
+        if callback is None or value == previous:
+            return
+        if edge == FakeGPIO.BOTH or edge == (FakeGPIO.RISING if value else FakeGPIO.FALLING):
+            callback(pin)
+
+    def cleanup(self):
+        self.callbacks = {}
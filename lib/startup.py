@@ -0,0 +1,115 @@
+import threading
+import time
+from logger import Logger
+
+
+class Stage:
+    """One step of startup: a function, the stages it has to wait for and its timing."""
+
+    def __init__(self, name, function, after, main_thread):
+        self.name = name
+        self.function = function
+        self.after = after
+        self.main_thread = main_thread
+        self.result = None
+        self.error = None
+        self.started = None
+        self.finished = None
+        self._done = threading.Event()
+
+    def elapsed(self):
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+    def run(self, startup):
+        for name in self.after:
+            dependency = startup.stages[name]
+            dependency._done.wait()
+            if dependency.error is not None:
+                self.error = RuntimeError('Skipped, ' + name + ' failed')
+                self._done.set()
+                return
+
+        self.started = time.monotonic()
+        try:
+            self.result = self.function()
+        except Exception as err:
+            Logger.write.exception('Startup stage ' + self.name + ' failed')
+            self.error = err
+        self.finished = time.monotonic()
+        self._done.set()
+
+
+class Startup:
+    """Runs the independent parts of startup side by side.
+
+    Each stage runs on its own thread as soon as the stages it comes after
+    have finished. Stages that have to be on the main thread (anything that
+    touches the SDL display) run there in the order they were added. run()
+    waits for every stage, logs how long each one took and returns their
+    results by name.
+    """
+
+    def __init__(self, name='startup'):
+        self.name = name
+        self.stages = {}
+        self.started = None
+
+    def add(self, name, function, after=(), main_thread=False):
+        """Add a stage. after names stages, already added, that must finish first."""
+        if name in self.stages:
+            raise ValueError("Startup stage '" + name + "' added twice")
+        for dependency in after:
+            if dependency not in self.stages:
+                raise ValueError("Startup stage '" + name + "' comes after unknown stage '" + dependency + "'")
+        self.stages[name] = Stage(name, function, list(after), main_thread)
+
+    def run(self):
+        self.started = time.monotonic()
+        threads = []
+        for stage in self.stages.values():
+            if not stage.main_thread:
+                thread = StageThread(len(threads), self.name + ':' + stage.name, stage, self)
+                thread.start()
+                threads.append(thread)
+        for stage in self.stages.values():
+            if stage.main_thread:
+                stage.run(self)
+        for thread in threads:
+            thread.join()
+
+        Logger.write.info(self.report())
+        for stage in self.stages.values():
+            if stage.error is not None:
+                raise RuntimeError('Startup stage ' + stage.name + ' failed') from stage.error
+        return {name: stage.result for name, stage in self.stages.items()}
+
+    def stats(self):
+        """Start offset and duration in ms of each stage that ran, in the order they started."""
+        stats = {}
+        stages = sorted([s for s in self.stages.values() if s.finished is not None], key=lambda s: s.started)
+        for stage in stages:
+            stats[stage.name] = {
+                'start_ms': round((stage.started - self.started) * 1000),
+                'ms': round(stage.elapsed() * 1000) if stage.elapsed() is not None else None
+            }
+        return stats
+
+    def report(self):
+        total = max([s.finished for s in self.stages.values() if s.finished is not None] + [self.started])
+        return (self.name + ' ready in ' + str(round((total - self.started) * 1000)) + 'ms: ' +
+                ', '.join(name + ' ' + str(s['ms']) + 'ms (+' + str(s['start_ms']) + ')'
+                          for name, s in self.stats().items()))
+
+
+class StageThread(threading.Thread):
+    def __init__(self, thread_id, name, stage, startup):
+        threading.Thread.__init__(self, daemon=True)
+        self.threadID = thread_id
+        self.name = name
+        self.stage = stage
+        self.startup = startup
+
+    def run(self):
+        self.stage.run(self.startup)
@@ -0,0 +1,61 @@
+def overflow_index(font, line, max_width):
+    """Return the length of the shortest prefix of line at least max_width wide.
+
+    Returns len(line) when the whole line fits. Prefix widths only grow as
+    characters are added, so this is a binary search costing O(log n) font
+    measurements rather than one per character.
+    """
+    lo, hi = 1, len(line)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if font.size(line[:mid])[0] < max_width:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def break_index(font, line, max_width):
+    """Return where to split line so the head fits in max_width.
+
+    Splits after the last space before the overflow point, keeping the
+    space on the head. A single word wider than max_width is split
+    mid-word rather than never making progress.
+    """
+    i = overflow_index(font, line, max_width)
+    if i < len(line):
+        space = line.rfind(" ", 0, i)
+        if space >= 0:
+            return space + 1
+        return max(i - 1, 1)
+    return i
+
+
+def wrap_text(font, text, box, line_spacing):
+    """Split text into lines that fit in a (width, height) box.
+
+    Blank lines are kept. Source lines that would start below the bottom of
+    the box are dropped.
+    """
+    # see http://pygame.org/wiki/TextWrap
+    box_w, box_h = box
+    font_height = font.size('Tg')[1]
+    wrapped = []
+    y = 0
+
+    for line in text.splitlines():
+        if y + font_height > box_h:
+            break
+
+        # keep blank lines
+        if len(line) == 0:
+            wrapped.append("")
+            y += line_spacing
+
+        while line:
+            i = break_index(font, line, box_w)
+            wrapped.append(line[:i])
+            y += line_spacing
+            line = line[i:]
+
+    return wrapped
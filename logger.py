@@ -1,17 +1,121 @@
+import atexit
 import logging
 import logging.handlers
+import queue
+import threading
+import time
+
+LOG_QUEUE_SIZE = 1000  # records held while syslog is slow before new ones are dropped
+FLUSH_TIMEOUT = 2.0  # seconds stop() waits for queued records to reach syslog
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets a call site log at most once every N seconds.
+
+    Opt in per call with extra={'rate_limit': seconds}. The next record
+    let through from that line says how many were suppressed in between.
+    Records without rate_limit always pass.
+    """
+
+    def __init__(self):
+        logging.Filter.__init__(self)
+        self.sites = {}  # (pathname, lineno) -> [last logged, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        interval = getattr(record, 'rate_limit', None)
+        if interval is None:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            site = self.sites.setdefault((record.pathname, record.lineno), [None, 0])
+            if site[0] is not None and now - site[0] < interval:
+                site[1] += 1
+                return False
+            suppressed = site[1]
+            site[0] = now
+            site[1] = 0
+        if suppressed:
+            record.msg = str(record.msg) + ' (' + str(suppressed) + ' similar suppressed)'
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread without ever waiting on it.
+
+    Records are queued unformatted, so %-style arguments are only turned
+    into text on the listener thread. If the queue is full (syslog has
+    stalled) the record is dropped and counted instead.
+    """
+
+    def __init__(self, log_queue):
+        logging.handlers.QueueHandler.__init__(self, log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class FlushingQueueListener(logging.handlers.QueueListener):
+    """A QueueListener whose stop() gives up after timeout seconds rather
+    than hanging on a stalled syslog.
+    """
+
+    def stop(self, timeout=FLUSH_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        try:
+            self.queue.put(self._sentinel, timeout=timeout)
+        except queue.Full:
+            return False
+        self._thread.join(max(deadline - time.monotonic(), 0))
+        flushed = not self._thread.is_alive()
+        self._thread = None
+        return flushed
 
 
 class Logger:
 
     write = None
+    listener = None
+    handler = None
 
     def __init__(self):
+        if Logger.listener is not None:
+            return
+
         syslog = logging.handlers.SysLogHandler(address='/dev/log')
         syslog.setFormatter(logging.Formatter('%(filename)s::%(funcName)s[%(process)d]: %(levelname)s %(message)s'))
+
+        # Callers only ever touch the queue; the blocking syslog writes
+        # happen on the listener's thread
+        Logger.handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        Logger.handler.addFilter(RateLimitFilter())
+        Logger.listener = FlushingQueueListener(Logger.handler.queue, syslog)
+        Logger.listener.start()
+        atexit.register(Logger.stop)
+
         Logger.write = logging.getLogger()
-        Logger.write.addHandler(syslog)
+        Logger.write.addHandler(Logger.handler)
         Logger.write.setLevel(logging.DEBUG)
 
     def __call__(self):
         return Logger.write
+
+    @staticmethod
+    def stop():
+        """Flush whatever is still queued to syslog and stop the listener."""
+        if Logger.listener is None:
+            return
+        if Logger.listener.stop() and Logger.handler.dropped:
+            for handler in Logger.listener.handlers:
+                handler.handle(Logger.write.makeRecord(
+                    Logger.write.name, logging.WARNING, __file__, 0,
+                    'Dropped %d log records while syslog was stalled', (Logger.handler.dropped,), None, 'stop'))
+        Logger.write.removeHandler(Logger.handler)
+        Logger.listener = None
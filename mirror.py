@@ -1,24 +1,39 @@
 #!/usr/bin/env python3
 import os
+import subprocess
 import sys
+import threading
 import time
 from random import *
-import mutagen
 import pygame
-from mutagen import mp3
+from lib.approach_detector import ApproachDetector
+from lib.audio_library import AudioLibrary
+from lib.audio_transcoder import AudioTranscoder, ENVELOPE_RATE, PCM_FORMAT
 from lib.display import MirrorDisplay
+from lib.mixer import Mixer
 from lib.dme import DME
+from lib import metrics
 from lib.ledstrip import LEDStrip
+from lib.scheduler import Scheduler
+from lib.startup import Startup
 from logger import Logger
 
 
 global GPIO_SIMULATED
 GPIO_SIMULATED = False
+HEADLESS = 'MIRROR_HEADLESS' in os.environ
 
 if 'GPIO_SIMULATED' in os.environ:
     GPIO_SIMULATED = True
     from EmulatorGUI import GPIO
     SENSOR_PUD = GPIO.PUD_DOWN
+elif HEADLESS:
+    # No hardware at all: fake GPIO and SDL's dummy video and audio drivers
+    # here, the sensor, LED strip and audio stand-ins from headless_parts()
+    from lib.simulation import FakeGPIO, use_headless_display
+    GPIO = FakeGPIO()
+    SENSOR_PUD = GPIO.PUD_UP
+    use_headless_display()
 else:
     import RPi.GPIO as GPIO
     SENSOR_PUD = GPIO.PUD_UP
@@ -32,78 +47,200 @@ RELAY_ON = GPIO.HIGH
 RELAY_OFF = GPIO.LOW
 
 SENSOR_GPIO_PIN = 21
-DEBOUNCE_TIME = 0.25
-
-DISTANCE_THRESHOLD = 1000  # mm
+SENSOR_GPIO_ENABLED = True  # Treat the sensor pin as an activation input alongside the DME
+SENSOR_ACTIVE = GPIO.LOW if SENSOR_PUD == GPIO.PUD_UP else GPIO.HIGH
+DEBOUNCE_TIME = 0.25  # seconds the sensor pin has to hold a level, the DME dwells on its own
+
+# Everything that can change the activation state posts one of these to the
+# pygame event queue, so the main loop sleeps until there's work to do
+INPUT_EVENT = pygame.USEREVENT + 1  # an input source may have changed
+DEBOUNCE_EVENT = pygame.USEREVENT + 2  # sensor pin debounce timer expired
+PREWARM_EVENT = pygame.USEREVENT + 3  # someone is walking up, get ready
+CUE_EVENT = pygame.USEREVENT + 4  # the music has faded out, load the next track
+
+DISTANCE_THRESHOLD = 1000  # mm, closer than this turns the mirror on
+DISTANCE_EXIT_THRESHOLD = 1200  # mm, farther than this turns it back off
+DISTANCE_ENTER_DWELL = 0.2  # seconds inside the threshold before turning on
+DISTANCE_EXIT_DWELL = 1.0  # seconds outside the exit threshold before turning off
+PREWARM_SPEED = 200  # mm/s towards the mirror that counts as an approach
+PREWARM_LEAD = 1.5  # seconds ahead of the predicted crossing to start pre-warming
 DISTANCE_SAMPLES = 15
+DISTANCE_ESTIMATOR = 'median'  # mean, median, trimmed or ema; median ignores the odd ToF spike
+# VL53L0X ranging modes: good, better, best, long_range or high_speed. The
+# sensor runs in the idle mode until someone approaches, then in the active mode
+DISTANCE_IDLE_MODE = 'long_range'
+DISTANCE_ACTIVE_MODE = 'high_speed'
+DISTANCE_IDLE_INTERVAL = 0.2  # seconds, minimum time between reads while idle
+# One entry per VL53L0X. Sensors sharing an address go behind a TCA9548A
+# multiplexer: add 'tca_num' (mux channel) and 'tca_addr' (mux address).
+DISTANCE_SENSORS = [
+    {'name': 'center', 'address': 0x29},
+]
+
+# LED strip effect: rainbow, breathing, chase or audio (brightness follows the
+# music's loudness, for tracks prepare_audio.py has transcoded)
+LED_EFFECT = 'rainbow'
+
+STOP_TIMEOUT = 2.0  # seconds to let the display and LEDs fade out on shutdown
+
+DIRTY_RECT_UPDATES = True  # False to flip the whole screen every frame
+
+# Only pick tracks that play at the mixer's current sample rate, so the audio
+# device never has to be reopened. Narrows the playlist if formats are mixed.
+PREFER_OPEN_AUDIO_FORMAT = False
+
+# Timing metrics (see lib/metrics.py). Off by default; when on, a snapshot
+# is written to METRICS_SNAPSHOT every METRICS_INTERVAL seconds and, if
+# METRICS_SOCKET is set, served to anyone connecting to that Unix socket.
+METRICS_ENABLED = False
+METRICS_SNAPSHOT = 'cache/metrics.json'
+METRICS_SOCKET = None  # e.g. '/tmp/mirror_metrics.sock'
+METRICS_INTERVAL = 10.0
+
+ACTIVATIONS = metrics.counter('activations')
+FIRST_FRAME = metrics.stopwatch('activation.first_frame')
+FIRST_AUDIO = metrics.stopwatch('activation.audio')
+
 
 class Sound:
-    def __init__(self):
-        os.system('amixer sset "PCM" 100%')
-        pygame.mixer.init()
-        self.library = {}
+    def __init__(self, mixer=None, library=None):
+        if mixer is None:
+            Sound.set_pcm_volume()
+            pygame.mixer.init()
+            mixer = Mixer()
+        self.mixer = mixer
+        # Loading a track can reopen the mixer, which has to happen on the
+        # main thread, so the fade thread only asks for it
+        self.mixer.on_stopped = lambda: pygame.event.post(pygame.event.Event(CUE_EVENT))
         self.now_playing = None
+        self.envelope = None  # loudness envelope of now_playing, if it's from the PCM cache
+        self.flat_tracks = set()  # tracks already reported as having no envelope
+        self.next_track = None
+        # Held while the track changes
+        self._lock = threading.RLock()
         self.base_path = os.path.join(os.path.dirname(os.path.abspath(__file__)))
         self.audio_dir = os.path.join(self.base_path, 'cache/audio')
+        if library is None:
+            library = AudioLibrary(self.audio_dir, os.path.join(self.base_path, 'cache/audio_index.json'))
+        self.library = library
+        self.transcoder = AudioTranscoder(self.audio_dir, os.path.join(self.base_path, 'cache/audio_pcm'))
+        self.library.refresh_async()
+        self.cue()
 
-    def _load_library(self):
-        self.library = {}
-        for file in os.listdir(self.audio_dir):
-            filename = os.path.join(self.audio_dir, file)
-            if self._verify_format(filename):
-                self.library[filename] = self.audio_format(filename)
-
-        Logger.write.info('Loaded ' + str(len(self.library)) + ' music files')
-
-    def play(self):
-        # reload the library each time in case the list has changed
-        self._load_library()
-
-        # If we have no music to play, don't play any music.
-        if len(self.library.items()) == 0:
-            return
-
-        # If we're muted, don't play music
-        if os.path.isfile(os.path.join(self.audio_dir, 'mute_audio.lock')):
-            return
-
-        filename, metadata = choice(list(self.library.items()))
-        self._init_mixer(metadata)
-        pygame.mixer.music.load(filename)
-        self.now_playing = pygame.mixer.music.play(-1)
-
-    # The mixer does not understand on its own how to play files at 48000Hz, etc.
     @staticmethod
-    def _init_mixer(metadata):
-        pygame.mixer.quit()
-        frequency = int(metadata.sample_rate / metadata.channels)
-        pygame.mixer.pre_init(frequency=frequency, channels=metadata.channels)
-        pygame.mixer.init()
+    def set_pcm_volume():
+        # Fire and forget, nothing waits on amixer
+        try:
+            subprocess.Popen(['amixer', 'sset', 'PCM', '100%'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except OSError as err:
+            Logger.write.warning('Could not set PCM volume: ' + str(err))
+
+    def track_format(self, filename, metadata):
+        """Return the file to actually play for a library track, and its mixer format.
+
+        Tracks that prepare_audio.py has decoded are played from the PCM cache.
+        """
+        pcm_file = self.transcoder.lookup(filename)
+        if pcm_file is not None:
+            return pcm_file, PCM_FORMAT
+        return filename, Mixer.mp3_format(metadata)
+
+    def prefer_open_format(self, tracks):
+        matching = {}
+        for filename, metadata in tracks.items():
+            if self.track_format(filename, metadata)[1] == self.mixer.format:
+                matching[filename] = metadata
+        if len(matching) == 0:
+            return tracks
+        return matching
+
+    def select(self):
+        track = self.library.choice(self.prefer_open_format if PREFER_OPEN_AUDIO_FORMAT else None)
+        if track is None:
+            return None
+        return self.track_format(*track)
+
+    def cue(self):
+        """Pick the next track and load it now, while nobody is waiting on it."""
+        with self._lock:
+            self.next_track = self.select()
+            if self.next_track is not None:
+                self.mixer.cue(*self.next_track)
+
+    def prewarm(self):
+        with self._lock:
+            if self.next_track is None and not self.is_busy():
+                self.cue()
 
-    @staticmethod
-    def _verify_format(file):
-        valid_format = True
-        audio = mutagen.File(file)
-        if type(audio) is not mutagen.mp3.MP3:
-            Logger.write.warn("Invalid audio type '" + str(type(audio)) + "' for " + file)
-            valid_format = False
-
-        return valid_format
-
-    @staticmethod
-    def audio_format(file):
-        audio = mutagen.File(file)
-        return audio.info
-
-    @staticmethod
-    def stop(fade_delay=3000):
-        pygame.mixer.music.fadeout(fade_delay)
-        time.sleep(fade_delay / 1000)
-        pygame.mixer.music.stop()
-
-    @staticmethod
-    def is_busy():
-        return pygame.mixer.music.get_busy()
+    def play(self):
+        with self._lock:
+            # Came back before the music finished fading out; pick up where we left off
+            if self.mixer.fading_out():
+                Logger.write.info("Resuming sound")
+                self.mixer.resume()
+                FIRST_AUDIO.stop()
+                return
+
+            if self.is_busy():
+                Logger.write.info("Sound already playing")
+                return
+
+            # If we're muted, don't play music
+            if os.path.isfile(os.path.join(self.audio_dir, 'mute_audio.lock')):
+                return
+
+            track = self.next_track
+            self.next_track = None
+            if track is None:
+                track = self.select()
+
+            # If we have no music to play, don't play any music.
+            if track is None:
+                return
+
+            filename, track_format = track
+            # Don't index the last track's envelope with this one's position
+            self.envelope = None
+            self.mixer.play(filename, track_format)
+            FIRST_AUDIO.stop()
+            self.now_playing = filename
+            self.envelope = self.load_envelope(filename)
+
+    def load_envelope(self, filename):
+        envelope = self.transcoder.envelope(filename)
+        if envelope is None and filename not in self.flat_tracks:
+            self.flat_tracks.add(filename)
+            Logger.write.info('No loudness envelope for ' + os.path.basename(filename) +
+                              ', run prepare_audio.py; the audio LED effect will only follow the volume')
+        return envelope
+
+    def level(self):
+        """How loud the music is right now, 0.0 - 1.0, for effects to follow.
+
+        Read off the envelope prepare_audio.py saved for the track. Tracks
+        without one (not yet transcoded) only report the fade volume.
+        Called every frame from the render thread, so it doesn't take the
+        lock; the envelope is read once and swapped whole by play().
+        """
+        volume = self.mixer.volume if self.is_busy() else 0.0
+        envelope = self.envelope
+        if not envelope:
+            return volume
+        step = int(self.mixer.position() * ENVELOPE_RATE) % len(envelope)
+        return volume * envelope[step] / 255
+
+    def stop(self, fade_delay=3000, delay=0):
+        """Fade the music out over fade_delay ms, starting delay seconds from now.
+
+        Returns immediately. The next track is cued once the music has stopped.
+        """
+        self.mixer.fade_out(fade_delay / 1000, delay)
+        # Pick up any changes to the audio directory in the background, now
+        # the visitor has gone rather than while the next one is arriving
+        self.library.refresh_async()
+
+    def is_busy(self):
+        return self.mixer.busy()
 
 
 class MirrorIO:
@@ -120,42 +257,91 @@ class MirrorIO:
             GPIO.output(pin, RELAY_OFF)
 
         if not quiet:
-            for pin in relay_list:  # cycle individual
-                GPIO.output(pin, RELAY_ON)
-                time.sleep(0.25)
-                GPIO.output(pin, RELAY_OFF)
-                time.sleep(0)
+            MirrorIO.cycle_relays(relay_list)
+
+    @staticmethod
+    def cycle_relays(relay_list):
+        """Click through the relays so you can hear they work. Takes a second or two."""
+        for pin in relay_list:  # cycle individual
+            GPIO.output(pin, RELAY_ON)
+            time.sleep(0.25)
+            GPIO.output(pin, RELAY_OFF)
+            time.sleep(0)
 
-            for pin in relay_list:  # all on
-                GPIO.output(pin, RELAY_ON)
-            time.sleep(1.0)
+        for pin in relay_list:  # all on
+            GPIO.output(pin, RELAY_ON)
+        time.sleep(1.0)
 
-            for pin in relay_list:  # all off
-                GPIO.output(pin, RELAY_OFF)
+        for pin in relay_list:  # all off
+            GPIO.output(pin, RELAY_OFF)
 
 
 class ActivationSensor:
 
-    def __init__(self, relay_list):
+    # sound, strip and tof_factory replace the real audio, LED strip and
+    # distance sensors, e.g. with the stand-ins from lib.simulation. Parts
+    # are brought up side by side as stages of startup, if given, along
+    # with whatever stages the caller has already added to it. A 'pygame'
+    # stage is added unless the caller has one.
+    def __init__(self, relay_list, sound=None, strip=None, tof_factory=None, startup=None):
         self.switch_override_state = False
-        self.sound = Sound()
-        basepath = os.path.dirname(os.path.abspath(__file__))
-        self.mirror = MirrorDisplay(basepath, fullscreen=(not GPIO_SIMULATED))
-        # self.mirror = mirror_display.MirrorText(fullscreen=(not GPIO_SIMULATED))
+        # The display and LED tasks share one scheduler thread. Distance
+        # reads block in the sensor library, so they get their own.
+        self.scheduler = Scheduler('render')
+        self.sensor_scheduler = Scheduler('sensor')
+        self.basepath = os.path.dirname(os.path.abspath(__file__))
+        self.mirror = None
         self.relay_list = relay_list
-        self.dme = DME(DISTANCE_THRESHOLD, DISTANCE_SAMPLES)
-        self.led_strip = LEDStrip()
+        self.input_state = False  # what the mirror is actually showing
+        self.gpio_state = False  # debounced level of the sensor pin
+        self.pending_gpio = None  # pin level waiting out the debounce timer
+        detector = ApproachDetector(DISTANCE_THRESHOLD, DISTANCE_EXIT_THRESHOLD,
+                                    DISTANCE_ENTER_DWELL, DISTANCE_EXIT_DWELL,
+                                    PREWARM_SPEED, PREWARM_LEAD)
+
+        if startup is None:
+            startup = Startup()
+        if 'pygame' not in startup.stages:
+            startup.add('pygame', pygame.init, main_thread=True)
+        # Opening the mixer and the display are SDL subsystem calls, which
+        # aren't thread safe, so both stay on the main thread
+        startup.add('display', self.start_display, after=['pygame'], main_thread=True)
+        startup.add('sound', lambda: sound if sound is not None else Sound(), after=['pygame'], main_thread=True)
+        # Loads alongside the sensors and LEDs, which take longer anyway, so
+        # a missing font directory stops startup rather than the first activation
+        startup.add('fonts', lambda: self.mirror.load(), after=['display'])
+        startup.add('distance sensors', lambda: DME(DISTANCE_THRESHOLD, DISTANCE_SAMPLES, DISTANCE_ESTIMATOR, detector,
+                                                    DISTANCE_IDLE_MODE, DISTANCE_ACTIVE_MODE, DISTANCE_IDLE_INTERVAL,
+                                                    DISTANCE_SENSORS, tof_factory, self.sensor_scheduler))
+        startup.add('leds', lambda: LEDStrip(strip, self.scheduler))
+        parts = startup.run()
+
+        self.sound = parts['sound']
+        self.dme = parts['distance sensors']
+        self.dme.on_change = lambda state: self.post_input_event('dme')
+        self.dme.on_approach = lambda: pygame.event.post(pygame.event.Event(PREWARM_EVENT))
+        self.led_strip = parts['leds']
+        if LED_EFFECT == 'audio':
+            self.led_strip.set_effect(LED_EFFECT, level=self.sound.level)
+        else:
+            self.led_strip.set_effect(LED_EFFECT)
         self.dme.run()
 
+        if SENSOR_GPIO_ENABLED and hasattr(GPIO, 'add_event_detect'):
+            GPIO.add_event_detect(SENSOR_GPIO_PIN, GPIO.BOTH, callback=lambda pin: self.post_input_event('gpio'))
+
+    def start_display(self):
+        self.mirror = MirrorDisplay(self.basepath, fullscreen=(not GPIO_SIMULATED), dirty_rects=DIRTY_RECT_UPDATES,
+                                    scheduler=self.scheduler)
+
     def stop(self):
         self.mirror.stop()
         self.led_strip.stop()
+        self.dme.stop()
         self.sound.stop(100)
-        # Let the thread finish
-        if self.mirror.thr is not None:
-            while self.mirror.thr.isAlive():
-                Logger.write.info("waiting for thread to finish")
-                pass
+        # Let the fade outs finish, then shut the schedulers down
+        self.scheduler.stop(STOP_TIMEOUT)
+        self.sensor_scheduler.stop(STOP_TIMEOUT)
 
         GPIO.output(RELAYS[1], RELAY_OFF)
 
@@ -167,17 +353,79 @@ class ActivationSensor:
         else:
             self.switch_override_state = False
 
+        self.input_changed()
+
+    @staticmethod
+    def read_gpio():
+        return SENSOR_GPIO_ENABLED and GPIO.input(SENSOR_GPIO_PIN) == SENSOR_ACTIVE
+
     def read_input_state(self):
-        return self.dme.in_range() or self.switch_override_state
+        return self.dme.in_range() or self.gpio_state or self.switch_override_state
+
+    # Called from sensor threads, so only hand off to the main loop
+    @staticmethod
+    def post_input_event(source):
+        pygame.event.post(pygame.event.Event(INPUT_EVENT, source=source))
+
+    def input_changed(self, source=None):
+        """Act on a change in one of the inputs, or re-check all of them if source is None.
+
+        Only the GPIO pin is debounced. The distance sensors already have to
+        dwell past the threshold in the ApproachDetector, so their changes
+        are acted on straight away.
+        """
+        if source is None or source == 'gpio':
+            self.gpio_changed()
+        self.update_state()
+
+    def update_state(self):
+        state = self.read_input_state()
+        if state != self.input_state:
+            self.input_state = state
+            self.state_changed(state)
+
+    def gpio_changed(self):
+        """Start or cancel the debounce timer for the sensor pin as needed."""
+        level = self.read_gpio()
+
+        if level == self.gpio_state:
+            # Bounced back before the debounce expired
+            if self.pending_gpio is not None:
+                pygame.time.set_timer(DEBOUNCE_EVENT, 0)
+                self.pending_gpio = None
+            return
+
+        if level != self.pending_gpio:
+            self.pending_gpio = level
+            pygame.time.set_timer(DEBOUNCE_EVENT, int(DEBOUNCE_TIME * 1000), 1)
+
+    def debounce_expired(self):
+        level = self.read_gpio()
+        pending = self.pending_gpio
+        self.pending_gpio = None
+
+        if level == pending:
+            self.gpio_state = level
+            self.update_state()
+        elif level != self.gpio_state:
+            self.gpio_changed()
+
+    def prewarm(self):
+        """Get audio and the first phrase ready before someone reaches the threshold."""
+        if self.input_state:
+            return
+        Logger.write.info("Approach detected, pre-warming")
+        self.sound.prewarm()
+        self.mirror.prepare()
 
     def state_changed(self, state):
         Logger.write.info("pin status: " + str(state))
         if state == True:
+            ACTIVATIONS.inc()
+            FIRST_FRAME.start()
+            FIRST_AUDIO.start()
 
-            if not self.sound.is_busy():
-                self.sound.play()
-            else:
-                Logger.write.info("Sound already playing")
+            self.sound.play()
 
             # time.sleep(1.5)
             # GPIO.output(RELAYS[1], RELAY_ON)  # relay 1
@@ -188,60 +436,84 @@ class ActivationSensor:
         else:
             self.mirror.stop()
             self.led_strip.stop()
-            time.sleep(1.5)
-            self.sound.stop()
+            self.sound.stop(delay=1.5)
 
             GPIO.output(RELAYS[1], RELAY_OFF)
 
 
+def handle_event(sensor, event):
+    """Act on one event from the main loop. Returns True when it's time to quit."""
+    if event.type == pygame.QUIT:
+        return True
+    elif event.type == pygame.KEYDOWN:
+        if event.key == pygame.K_SPACE:
+            new_state = not sensor.switch_override_state
+            Logger.write.info("Setting state " + str(new_state))
+            sensor.input_override(new_state)
+        elif event.key == pygame.K_ESCAPE or event.key == pygame.K_q:
+            return True
+    elif event.type == INPUT_EVENT:
+        sensor.input_changed(event.source)
+    elif event.type == DEBOUNCE_EVENT:
+        sensor.debounce_expired()
+    elif event.type == PREWARM_EVENT:
+        sensor.prewarm()
+    elif event.type == CUE_EVENT:
+        sensor.sound.cue()
+    return False
+
+
+def headless_parts():
+    """ActivationSensor arguments that swap the distance sensor, LED strip and
+    audio for the lib.simulation stand-ins. Nobody ever walks up; for scripted
+    visitors see benchmarks/activation_benchmark.py.
+    """
+    from lib.ledstrip import LED_COUNT
+    from lib.simulation import DistanceTrace, FakeLibrary, FakeToF, FrameRecorder, NullMixer
+    trace = DistanceTrace([(0, DISTANCE_EXIT_THRESHOLD * 2)])
+    return {
+        'sound': Sound(NullMixer(), FakeLibrary()),
+        'strip': FrameRecorder(LED_COUNT),
+        'tof_factory': lambda *args: FakeToF(trace)
+    }
+
+
 def main(argv):
     # TODO: Make mirror display diagnostic info on startup (especially warnings)
     # TODO: Make mirror clear warnings and start loop on first sensor activation (or after X seconds?)
 
     log = Logger()  # this has to be called at least once
     Logger.write.info('Starting up')
-    try:
-        Logger.write.debug('Initializing pygame')
-        pygame.init()
-    except (KeyboardInterrupt, SystemExit) as err:
-        Logger.write.error('FATAL:' + err)
-        raise
 
-    relay_list = list(RELAYS.values())
-    MirrorIO.init_gpio(relay_list, quiet=False)
+    if METRICS_ENABLED:
+        basepath = os.path.dirname(os.path.abspath(__file__))
+        metrics.start(os.path.join(basepath, METRICS_SNAPSHOT), METRICS_SOCKET, METRICS_INTERVAL)
 
-    sensor = ActivationSensor(relay_list)
-    last_input_state = sensor.read_input_state
+    relay_list = list(RELAYS.values())
+    MirrorIO.init_gpio(relay_list)
+
+    # pygame is set up on the main thread while the relays click through and
+    # the sensors and LEDs come up; ActivationSensor adds the rest
+    startup = Startup()
+    startup.add('pygame', pygame.init, main_thread=True)
+    startup.add('relays', lambda: MirrorIO.cycle_relays(relay_list))
+    parts = headless_parts() if HEADLESS else {}
+    sensor = ActivationSensor(relay_list, startup=startup, **parts)
+    # Pick up whatever state the inputs are already in
+    sensor.input_changed()
 
     done = False
 
     try:
         log.write.info('Ready, starting loop')
         while not done:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    done = True
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_SPACE:
-                        new_state = not sensor.switch_override_state
-                        log.write.info("Setting state " + str(new_state))
-                        sensor.input_override(new_state)
-                    elif event.key == pygame.K_ESCAPE or event.key == pygame.K_q:
-                        done = True
-
-            input_state = sensor.read_input_state()
-            if input_state != last_input_state:
-                time.sleep(DEBOUNCE_TIME)  # wait to make sure it really changed
-                if input_state != last_input_state:
-                    last_input_state = input_state
-                    sensor.state_changed(input_state)
-            time.sleep(0.1)
+            done = handle_event(sensor, pygame.event.wait())
     except (KeyboardInterrupt, SystemExit):
         # TODO: fix GPIO emulator threading bug that prevents clean shutdown
         GPIO.cleanup()
         sys.exit
     finally:
-        sensor.dme.stop()
+        sensor.stop()
         GPIO.cleanup()
         sys.exit
 
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# Decode the audio library into the PCM cache ahead of time so the mirror
+# never has to decode MP3s or reopen the mixer when someone walks up.
+# Also saves each track's loudness envelope, which the 'audio' LED effect follows.
+# Needs ffmpeg. Re-run after adding music; the mirror falls back to the
+# original MP3 for anything not yet prepared.
+import os
+import sys
+import time
+from lib.audio_library import AudioLibrary
+from lib.audio_transcoder import AudioTranscoder
+from logger import Logger
+
+
+def main(argv):
+    Logger()
+    base_path = os.path.dirname(os.path.abspath(__file__))
+    audio_dir = os.path.join(base_path, 'cache/audio')
+
+    library = AudioLibrary(audio_dir, os.path.join(base_path, 'cache/audio_index.json'))
+    library.refresh()
+    transcoder = AudioTranscoder(audio_dir, os.path.join(base_path, 'cache/audio_pcm'))
+
+    started = time.monotonic()
+    transcoded = transcoder.transcode_all(list(library.tracks.keys()))
+    print('Transcoded ' + str(transcoded) + ' of ' + str(len(library)) + ' tracks in ' +
+          str(round(time.monotonic() - started, 1)) + 's')
+
+
+if __name__ == "__main__":
+    main(sys.argv)
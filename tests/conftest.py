@@ -0,0 +1,30 @@
+import logging
+import os
+import sys
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+from logger import Logger
+
+# Plain logging instead of syslog, as the benchmarks do
+if Logger.write is None:
+    Logger.write = logging.getLogger()
+
+
+class FakeTime:
+    """Stands in for the time module in the module under test, so time only
+    moves when the test says so.
+    """
+
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
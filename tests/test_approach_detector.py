@@ -0,0 +1,86 @@
+import pytest
+from lib.approach_detector import ApproachDetector
+
+
+def feed(detector, points, step=0.05):
+    """Feed (seconds, mm) points, interpolating a sample every step seconds.
+    Returns the times at which update() reported an approach starting."""
+    started = []
+    t = points[0][0]
+    for (t0, d0), (t1, d1) in zip(points, points[1:]):
+        while t < t1:
+            distance = d0 + (d1 - d0) * (t - t0) / (t1 - t0)
+            if detector.update(distance, t):
+                started.append(t)
+            t += step
+    return started
+
+
+def test_enter_needs_the_dwell():
+    detector = ApproachDetector(1000, 1200, enter_dwell=0.2)
+    detector.update(900, 0.0)
+    assert not detector.present
+    detector.update(900, 0.1)
+    assert not detector.present
+    detector.update(900, 0.2)
+    assert detector.present
+
+
+def test_dipping_out_restarts_the_dwell():
+    detector = ApproachDetector(1000, 1200, enter_dwell=0.2)
+    detector.update(900, 0.0)
+    detector.update(1100, 0.15)
+    detector.update(900, 0.2)
+    detector.update(900, 0.35)
+    assert not detector.present
+    detector.update(900, 0.4)
+    assert detector.present
+
+
+def test_hysteresis_between_thresholds():
+    detector = ApproachDetector(1000, 1200, exit_dwell=1.0)
+    detector.update(900, 0.0)
+    assert detector.present
+    # Between the thresholds: stays on however long it lasts
+    for t in range(1, 10):
+        detector.update(1100, float(t))
+    assert detector.present
+    detector.update(1300, 10.0)
+    detector.update(1300, 10.5)
+    assert detector.present
+    detector.update(1300, 11.0)
+    assert not detector.present
+
+
+def test_exit_threshold_defaults_to_enter():
+    detector = ApproachDetector(1000)
+    detector.update(900, 0.0)
+    detector.update(1001, 0.1)
+    assert not detector.present
+
+
+def test_velocity_is_the_least_squares_slope():
+    detector = ApproachDetector(1000)
+    for i in range(5):
+        detector.update(2000 - 500 * i * 0.1, i * 0.1)
+    assert detector.velocity == pytest.approx(-500)
+
+
+def test_walking_up_flags_one_approach_ahead_of_the_threshold():
+    detector = ApproachDetector(1000, 1200, enter_dwell=0.2, prewarm_speed=200, prewarm_lead=1.5)
+    # 1m/s towards the mirror from 3m, crossing 1000mm at t=2
+    started = feed(detector, [(0, 3000), (2.5, 500), (5, 500)])
+    assert len(started) == 1
+    assert 0.4 <= started[0] < 2.0
+    assert detector.present
+
+
+def test_standing_still_never_approaches():
+    detector = ApproachDetector(1000, prewarm_speed=200)
+    assert feed(detector, [(0, 1500), (5, 1500)]) == []
+
+
+def test_walking_away_never_approaches():
+    detector = ApproachDetector(1000, prewarm_speed=200)
+    assert feed(detector, [(0, 1100), (3, 3000)]) == []
+    assert detector.time_to_enter() is None
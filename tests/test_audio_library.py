@@ -0,0 +1,85 @@
+import os
+import pytest
+from lib.audio_library import AudioInfo, AudioLibrary
+
+
+@pytest.fixture
+def probes(monkeypatch):
+    """Fake mutagen probe: .mp3 files are valid 44.1kHz stereo, anything else isn't audio."""
+    probed = []
+
+    def probe(path):
+        probed.append(os.path.basename(path))
+        valid = path.endswith('.mp3')
+        return {'valid': valid, 'sample_rate': 44100 if valid else 0, 'channels': 2 if valid else 0,
+                'length': 60.0 if valid else 0}
+
+    monkeypatch.setattr(AudioLibrary, 'probe', staticmethod(probe))
+    return probed
+
+
+def touch(path, content=b'x'):
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+@pytest.fixture
+def audio_dir(tmp_path):
+    audio = tmp_path / 'audio'
+    audio.mkdir()
+    touch(str(audio / 'a.mp3'))
+    touch(str(audio / 'b.mp3'))
+    touch(str(audio / 'notes.txt'))
+    touch(str(audio / 'mute_audio.lock'))
+    return audio
+
+
+def test_refresh_indexes_playable_tracks(audio_dir, tmp_path, probes):
+    library = AudioLibrary(str(audio_dir), str(tmp_path / 'index.json'))
+    library.refresh()
+    assert sorted(probes) == ['a.mp3', 'b.mp3', 'notes.txt']
+    assert library.tracks == {
+        str(audio_dir / 'a.mp3'): AudioInfo(44100, 2, 60.0),
+        str(audio_dir / 'b.mp3'): AudioInfo(44100, 2, 60.0),
+    }
+
+
+def test_index_is_reused_across_restarts(audio_dir, tmp_path, probes):
+    index = str(tmp_path / 'index.json')
+    AudioLibrary(str(audio_dir), index).refresh()
+    del probes[:]
+
+    library = AudioLibrary(str(audio_dir), index)
+    assert len(library) == 2  # straight from the index, before any scan
+    library.refresh()
+    assert probes == []
+
+
+def test_only_changed_files_are_probed(audio_dir, tmp_path, probes):
+    library = AudioLibrary(str(audio_dir), str(tmp_path / 'index.json'))
+    library.refresh()
+    del probes[:]
+
+    touch(str(audio_dir / 'a.mp3'), b'longer')
+    os.remove(str(audio_dir / 'b.mp3'))
+    touch(str(audio_dir / 'c.mp3'))
+    library.refresh()
+    assert sorted(probes) == ['a.mp3', 'c.mp3']
+    assert sorted(os.path.basename(path) for path in library.tracks) == ['a.mp3', 'c.mp3']
+
+
+def test_unreadable_index_is_ignored(audio_dir, tmp_path, probes):
+    index = tmp_path / 'index.json'
+    index.write_text('{"files": ')
+    library = AudioLibrary(str(audio_dir), str(index))
+    assert len(library) == 0
+    library.refresh()
+    assert len(library) == 2
+
+
+def test_choice_with_preference(audio_dir, tmp_path, probes):
+    library = AudioLibrary(str(audio_dir), str(tmp_path / 'index.json'))
+    assert library.choice() is None
+    library.refresh()
+    wanted = str(audio_dir / 'b.mp3')
+    assert library.choice(lambda tracks: {wanted: tracks[wanted]})[0] == wanted
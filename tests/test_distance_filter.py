@@ -0,0 +1,71 @@
+import random
+import statistics
+import pytest
+from lib.distance_filter import DistanceFilter
+
+
+def windows(size, samples):
+    """Each sliding window of samples the filter should be holding."""
+    for end in range(1, len(samples) + 1):
+        yield samples[max(end - size, 0):end]
+
+
+@pytest.fixture
+def samples():
+    rng = random.Random(1)
+    return [rng.randint(30, 2500) for _ in range(200)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 5, 15, 16])
+def test_mean_and_median_match_statistics(size, samples):
+    distances = DistanceFilter(size)
+    for value, window in zip(samples, windows(size, samples)):
+        distances.add(value)
+        assert distances.mean() == pytest.approx(statistics.mean(window))
+        assert distances.median() == pytest.approx(statistics.median(window))
+
+
+def test_trimmed_mean_drops_the_tails(samples):
+    distances = DistanceFilter(10, 'trimmed', trim=0.2)
+    for value in samples:
+        distances.add(value)
+    window = sorted(samples[-10:])
+    assert distances.estimate() == pytest.approx(statistics.mean(window[2:-2]))
+
+
+def test_ema():
+    distances = DistanceFilter(5, 'ema', ema_alpha=0.5)
+    for value in [100, 200, 200]:
+        distances.add(value)
+    assert distances.estimate() == pytest.approx(175)
+
+
+def test_estimator_selects_the_reading():
+    for estimator, expected in [('mean', 400), ('median', 100)]:
+        distances = DistanceFilter(3, estimator)
+        for value in [100, 100, 1000]:
+            distances.add(value)
+        assert distances.estimate() == pytest.approx(expected)
+
+
+def test_values_are_clamped_to_the_sample_array():
+    distances = DistanceFilter(2)
+    distances.add(-5)
+    distances.add(70000)
+    assert distances.median() == pytest.approx((0 + 65535) / 2)
+
+
+def test_empty_and_full():
+    distances = DistanceFilter(2)
+    assert distances.estimate() is None
+    distances.add(1)
+    assert not distances.full()
+    distances.add(1)
+    distances.add(1)
+    assert distances.full()
+    assert len(distances) == 2
+
+
+def test_unknown_estimator():
+    with pytest.raises(ValueError):
+        DistanceFilter(5, 'mode')
@@ -0,0 +1,48 @@
+import pytest
+from conftest import FakeTime
+from lib import frame_clock
+from lib.frame_clock import FrameClock
+
+
+@pytest.fixture
+def clock_time(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(frame_clock, 'time', fake)
+    return fake
+
+
+def test_on_time_frames_get_consecutive_slots(clock_time):
+    clock = FrameClock(10)
+    clock.start()
+    assert clock.advance() == pytest.approx(100.1)
+    clock_time.now = 100.1
+    assert clock.advance() == pytest.approx(100.2)
+    assert clock.frames == 2
+    assert clock.dropped == 0
+    assert clock.stats()['max_late_ms'] == 0
+
+
+def test_late_frame_drops_missed_slots_and_realigns(clock_time):
+    clock = FrameClock(10)
+    clock.start()
+    # Slot was due at 100.1, we're back at 100.35: the 100.2 and 100.3 slots are gone
+    clock_time.now = 100.35
+    assert clock.advance() == pytest.approx(100.35)
+    assert clock.dropped == 2
+    assert clock.late_max == pytest.approx(0.25)
+    assert clock.advance() == pytest.approx(100.4)
+
+
+def test_vsync_wakes_a_refresh_early(clock_time):
+    clock = FrameClock(30, vsync=True, refresh_rate=60)
+    clock.start()
+    assert clock.advance() == pytest.approx(100 + 1 / 30 - 1 / 60)
+
+
+def test_actual_fps(clock_time):
+    clock = FrameClock(10)
+    assert clock.actual_fps() == 0.0
+    clock.start()
+    for _ in range(5):
+        clock_time.now = clock.advance()
+    assert clock.actual_fps() == pytest.approx(5 / 0.4)
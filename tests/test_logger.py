@@ -0,0 +1,64 @@
+import logging
+import queue
+import logger
+from logger import RateLimitFilter, NonBlockingQueueHandler
+from conftest import FakeTime
+
+
+def make_record(msg='Sensor timeout', lineno=10, rate_limit=None):
+    record = logging.LogRecord('root', logging.WARNING, 'mirror.py', lineno, msg, None, None)
+    if rate_limit is not None:
+        record.rate_limit = rate_limit
+    return record
+
+
+def test_records_without_rate_limit_always_pass(monkeypatch):
+    monkeypatch.setattr(logger, 'time', FakeTime())
+    rate_limit = RateLimitFilter()
+    assert all(rate_limit.filter(make_record()) for _ in range(5))
+
+
+def test_repeats_within_the_interval_are_suppressed(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(logger, 'time', fake)
+    rate_limit = RateLimitFilter()
+    assert rate_limit.filter(make_record(rate_limit=5))
+    fake.sleep(1)
+    assert not rate_limit.filter(make_record(rate_limit=5))
+    fake.sleep(1)
+    assert not rate_limit.filter(make_record(rate_limit=5))
+
+
+def test_next_record_counts_the_suppressed_ones(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(logger, 'time', fake)
+    rate_limit = RateLimitFilter()
+    rate_limit.filter(make_record(rate_limit=5))
+    for _ in range(3):
+        fake.sleep(1)
+        rate_limit.filter(make_record(rate_limit=5))
+    fake.sleep(5)
+    record = make_record(rate_limit=5)
+    assert rate_limit.filter(record)
+    assert record.getMessage() == 'Sensor timeout (3 similar suppressed)'
+
+    fake.sleep(5)
+    record = make_record(rate_limit=5)
+    assert rate_limit.filter(record)
+    assert record.getMessage() == 'Sensor timeout'
+
+
+def test_call_sites_are_limited_separately(monkeypatch):
+    monkeypatch.setattr(logger, 'time', FakeTime())
+    rate_limit = RateLimitFilter()
+    assert rate_limit.filter(make_record(lineno=10, rate_limit=5))
+    assert rate_limit.filter(make_record(lineno=20, rate_limit=5))
+    assert not rate_limit.filter(make_record(lineno=10, rate_limit=5))
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = NonBlockingQueueHandler(queue.Queue(2))
+    for _ in range(5):
+        handler.handle(make_record())
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
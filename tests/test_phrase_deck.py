@@ -0,0 +1,64 @@
+import json
+import os
+from lib.phrase_deck import PhraseDeck
+
+
+def write(path, data, mtime=None):
+    with open(path, 'w') as f:
+        f.write(data if isinstance(data, str) else json.dumps(data))
+    if mtime is not None:
+        os.utime(path, ns=(mtime, mtime))
+
+
+def test_only_rereads_when_the_file_changes(tmp_path):
+    path = str(tmp_path / 'phrases.json')
+    write(path, {'phrases': [{'text': 'one', 'duration': 5}]}, mtime=1000)
+    deck = PhraseDeck(path)
+    assert deck.refresh()
+    assert not deck.refresh()
+
+    write(path, {'phrases': [{'text': 'one', 'duration': 5}, {'text': 'two', 'duration': 6}]}, mtime=2000)
+    assert deck.refresh()
+    assert [p['text'] for p in deck.phrases] == ['one', 'two']
+
+
+def test_bad_edit_keeps_the_old_phrases(tmp_path):
+    path = str(tmp_path / 'phrases.json')
+    write(path, {'phrases': [{'text': 'one', 'duration': 5}]}, mtime=1000)
+    deck = PhraseDeck(path)
+    deck.refresh()
+
+    write(path, '{"phrases": [', mtime=2000)
+    assert not deck.refresh()
+    assert len(deck) == 1
+
+
+def test_missing_file(tmp_path):
+    deck = PhraseDeck(str(tmp_path / 'missing.json'))
+    assert not deck.refresh()
+    assert deck.deal() == []
+
+
+def test_validate_skips_malformed_phrases():
+    phrases = PhraseDeck.validate({'phrases': [
+        {'text': 'ok', 'duration': 3},
+        {'text': '   ', 'duration': 3},
+        {'text': 'no duration'},
+        {'text': 'bool duration', 'duration': True},
+        {'text': 'negative', 'duration': -1},
+        'not an object',
+        {'text': 'float', 'duration': 2.5, 'extra': 'dropped'},
+    ]})
+    assert phrases == [{'text': 'ok', 'duration': 3}, {'text': 'float', 'duration': 2.5}]
+    assert PhraseDeck.validate(['not', 'a', 'dict']) == []
+
+
+def test_deal_is_a_shuffled_copy(tmp_path):
+    path = str(tmp_path / 'phrases.json')
+    write(path, {'phrases': [{'text': str(i), 'duration': 1} for i in range(20)]})
+    deck = PhraseDeck(path)
+    deck.refresh()
+    dealt = deck.deal()
+    assert sorted(p['text'] for p in dealt) == sorted(p['text'] for p in deck.phrases)
+    dealt.pop()
+    assert len(deck) == 20
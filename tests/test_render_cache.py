@@ -0,0 +1,45 @@
+from lib.render_cache import RenderCache
+
+
+def test_lru_eviction_by_size():
+    cache = RenderCache(max_bytes=100)
+    cache.put('a', 'A', 40)
+    cache.put('b', 'B', 40)
+    assert cache.get('a') == 'A'  # now b is the least recently used
+    cache.put('c', 'C', 40)
+    assert cache.get('b') is None
+    assert cache.get('a') == 'A'
+    assert cache.get('c') == 'C'
+    assert cache.bytes == 80
+
+
+def test_replacing_a_key_keeps_the_size_right():
+    cache = RenderCache(max_bytes=100)
+    cache.put('a', 'A', 40)
+    cache.put('a', 'A2', 10)
+    assert cache.get('a') == 'A2'
+    assert cache.bytes == 10
+    assert len(cache) == 1
+
+
+def test_oversized_entries_are_not_cached():
+    cache = RenderCache(max_bytes=100)
+    cache.put('a', 'A', 40)
+    cache.put('huge', 'H', 101)
+    assert cache.get('huge') is None
+    assert cache.get('a') == 'A'
+
+
+def test_layout_only_wraps_on_a_miss():
+    cache = RenderCache()
+    calls = []
+
+    def wrap(font, text, box):
+        calls.append(text)
+        return text.split()
+
+    assert cache.layout('font', 'one two', (100, 100), wrap) == ('one', 'two')
+    assert cache.layout('font', 'one two', (100, 100), wrap) == ('one', 'two')
+    cache.layout('font', 'one two', (200, 100), wrap)
+    assert calls == ['one two', 'one two']
+    assert cache.stats()['hits'] == 1
@@ -0,0 +1,105 @@
+import time
+import pytest
+from lib.scheduler import Scheduler
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = Scheduler('test')
+    yield scheduler
+    scheduler.stop(0)
+
+
+def test_tasks_run_in_deadline_order(scheduler):
+    order = []
+
+    def task(token, name, delay):
+        yield time.monotonic() + delay
+        order.append(name)
+
+    start = time.monotonic()
+    tasks = [scheduler.spawn(name, task, name, delay) for name, delay in [('late', 0.06), ('early', 0.02)]]
+    for t in tasks:
+        assert t.join(1)
+    assert order == ['early', 'late']
+    assert time.monotonic() - start >= 0.06
+
+
+def test_waiting_on_another_task(scheduler):
+    order = []
+
+    def first(token):
+        yield time.monotonic() + 0.03
+        order.append('first')
+
+    def second(token, previous):
+        yield previous
+        order.append('second')
+
+    a = scheduler.spawn('first', first)
+    b = scheduler.spawn('second', second, a)
+    assert b.join(1)
+    assert order == ['first', 'second']
+
+
+def test_cancel_wakes_a_sleeping_task(scheduler):
+    def sleeper(token):
+        while not token.cancelled:
+            yield time.monotonic() + 60
+
+    task = scheduler.spawn('sleeper', sleeper)
+    time.sleep(0.02)
+    started = time.monotonic()
+    task.cancel()
+    assert task.join(1)
+    assert time.monotonic() - started < 0.5
+
+
+def test_failing_task_is_recorded_and_others_carry_on(scheduler):
+    def broken(token):
+        yield None
+        raise ValueError('boom')
+
+    def fine(token):
+        yield time.monotonic() + 0.02
+
+    bad = scheduler.spawn('broken', broken)
+    good = scheduler.spawn('fine', fine)
+    assert bad.join(1) and good.join(1)
+    assert isinstance(bad.error, ValueError)
+    assert good.error is None
+    assert scheduler.stats()['broken']['runs'] == 1
+
+
+def test_stop_closes_tasks_that_outlive_the_timeout():
+    scheduler = Scheduler('test')
+    cleaned_up = []
+
+    def stubborn(token):
+        try:
+            while True:
+                yield time.monotonic() + 60
+        finally:
+            cleaned_up.append(True)
+
+    task = scheduler.spawn('stubborn', stubborn)
+    time.sleep(0.02)
+    scheduler.stop(0.05)
+    assert cleaned_up == [True]
+    assert not task.running()
+    assert not scheduler.thr.is_alive()
+    with pytest.raises(RuntimeError):
+        scheduler.spawn('too late', stubborn)
+
+
+def test_stop_lets_tasks_finish_first():
+    scheduler = Scheduler('test')
+    finished = []
+
+    def quick(token):
+        yield time.monotonic() + 0.03
+        finished.append(True)
+
+    scheduler.spawn('quick', quick)
+    scheduler.stop(1)
+    assert finished == [True]
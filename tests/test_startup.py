@@ -0,0 +1,73 @@
+import threading
+import time
+import pytest
+from lib.startup import Startup
+
+
+def test_stages_wait_for_their_dependencies():
+    order = []
+    startup = Startup()
+    startup.add('config', lambda: order.append('config') or 'cfg')
+    startup.add('library', lambda: time.sleep(0.02) or order.append('library'), after=['config'])
+    startup.add('sound', lambda: order.append('sound') or 'snd', after=['library'])
+    results = startup.run()
+    assert order == ['config', 'library', 'sound']
+    assert results['config'] == 'cfg'
+    assert results['sound'] == 'snd'
+
+
+def test_unknown_and_duplicate_stages_are_rejected():
+    startup = Startup()
+    startup.add('a', lambda: None)
+    with pytest.raises(ValueError):
+        startup.add('a', lambda: None)
+    with pytest.raises(ValueError):
+        startup.add('b', lambda: None, after=['missing'])
+
+
+def test_independent_stages_run_side_by_side():
+    startup = Startup()
+    for name in ['a', 'b', 'c']:
+        startup.add(name, lambda: time.sleep(0.1))
+    started = time.monotonic()
+    startup.run()
+    assert time.monotonic() - started < 0.25
+
+
+def test_main_thread_stages_run_on_the_main_thread():
+    threads = {}
+    startup = Startup()
+    startup.add('worker', lambda: threads.setdefault('worker', threading.current_thread()))
+    startup.add('display', lambda: threads.setdefault('display', threading.current_thread()),
+                after=['worker'], main_thread=True)
+    startup.run()
+    assert threads['display'] is threading.main_thread()
+    assert threads['worker'] is not threading.main_thread()
+
+
+def test_failure_skips_dependents_and_raises():
+    ran = []
+
+    def broken():
+        raise OSError('no device')
+
+    startup = Startup()
+    startup.add('sensor', broken)
+    startup.add('loop', lambda: ran.append('loop'), after=['sensor'])
+    startup.add('other', lambda: ran.append('other'))
+    with pytest.raises(RuntimeError) as err:
+        startup.run()
+    assert isinstance(err.value.__cause__, OSError)
+    assert ran == ['other']
+    assert 'sensor failed' in str(startup.stages['loop'].error)
+
+
+def test_report_lists_each_stage():
+    startup = Startup('boot')
+    startup.add('a', lambda: None)
+    startup.add('b', lambda: None, after=['a'])
+    startup.run()
+    assert list(startup.stats()) == ['a', 'b']
+    report = startup.report()
+    assert report.startswith('boot ready in ')
+    assert 'a ' in report and 'b ' in report
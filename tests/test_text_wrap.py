@@ -0,0 +1,49 @@
+import os
+import sys
+import pygame
+import pytest
+from conftest import BASE_PATH
+from lib.text_wrap import wrap_text
+
+sys.path.insert(0, os.path.join(BASE_PATH, 'benchmarks'))
+from wrap_benchmark import FONT_SIZE, LINE_SPACING, PHRASES, legacy_wrap
+
+FONT_DIR = os.path.join(BASE_PATH, 'data', 'fonts')
+BOX = (1728, 972)
+
+
+class MonoFont:
+    """Every character 10px wide, so tests can reason about widths."""
+
+    def size(self, text):
+        return len(text) * 10, 20
+
+
+@pytest.fixture(scope='module', params=sorted(os.listdir(FONT_DIR)))
+def font(request):
+    pygame.font.init()
+    return pygame.font.Font(os.path.join(FONT_DIR, request.param), FONT_SIZE)
+
+
+@pytest.mark.parametrize('text', PHRASES + ['first line\n\nafter a blank line', 'short'])
+def test_matches_legacy_wrap(font, text):
+    line_spacing = font.size('Tg')[1] + LINE_SPACING
+    assert wrap_text(font, text, BOX, line_spacing) == legacy_wrap(font, text, BOX, line_spacing)
+
+
+def test_breaks_after_the_last_space_that_fits():
+    # A line has to be narrower than the box, so 9 characters fit in 100px
+    assert wrap_text(MonoFont(), 'aaa bbb ccc ddd', (100, 1000), 20) == ['aaa bbb ', 'ccc ddd']
+
+
+def test_overlong_word_is_split_instead_of_looping():
+    # The legacy wrap finds no space, takes rfind() + 1 == 0 and never makes
+    # progress on a word wider than the box; text_wrap splits it mid-word
+    lines = wrap_text(MonoFont(), 'x' * 25, (100, 1000), 20)
+    assert ''.join(lines) == 'x' * 25
+    assert all(MonoFont().size(line)[0] <= 100 for line in lines)
+
+
+def test_lines_below_the_box_are_dropped():
+    text = '\n'.join(['line'] * 10)
+    assert len(wrap_text(MonoFont(), text, (100, 60), 20)) == 3